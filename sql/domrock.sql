@@ -24,6 +24,7 @@ CREATE TABLE IF NOT EXISTS vendas (
     SKU VARCHAR(50),
     zs_peso_liquido DECIMAL(18,8),
     giro_sku_cliente DECIMAL(18,8),
+    hash_linha CHAR(32),
     FOREIGN KEY (cod_cliente) REFERENCES clientes (cod_cliente),
     FOREIGN KEY (cod_produto) REFERENCES produtos (cod_produto)
 );
@@ -42,6 +43,7 @@ CREATE TABLE IF NOT EXISTS estoque (
     grupo_mercadoria VARCHAR(100),
     es_totalestoque DECIMAL(18,8),
     SKU VARCHAR(50),
+    hash_linha CHAR(32),
     FOREIGN KEY (cod_cliente) REFERENCES clientes (cod_cliente),
     FOREIGN KEY (cod_produto) REFERENCES produtos (cod_produto)
 );
@@ -51,5 +53,18 @@ CREATE TABLE IF NOT EXISTS usuario(
     nome VARCHAR(100) NOT NULL,
     email VARCHAR(100) UNIQUE NOT NULL,
     senha VARCHAR(100) NOT NULL
-)
+);
+
+-- Registro dos arquivos importados (sha256 do arquivo inteiro)
+CREATE TABLE IF NOT EXISTS importacoes (
+    id SERIAL PRIMARY KEY,
+    tipo VARCHAR(20) NOT NULL,
+    arquivo VARCHAR(255),
+    sha256 CHAR(64) NOT NULL,
+    linhas_lidas INT,
+    linhas_inseridas INT,
+    importado_em TIMESTAMP NOT NULL DEFAULT NOW(),
+    UNIQUE (tipo, sha256)
+);
 
+-- Hash das linhas, índices e particionamento ficam em sql/migrations (python src/migrar.py)
@@ -0,0 +1,39 @@
+-- Índices das consultas de dashboards, relatórios e chatbot.
+-- Roda dentro de uma transação pelo migrar.py (por isso não usa CONCURRENTLY).
+
+-- BRIN em data: ocupa poucos KB e funciona bem porque as cargas chegam em
+-- ordem de data, então a ordem física da tabela acompanha a coluna
+CREATE INDEX IF NOT EXISTS vendas_data_brin ON domrock.vendas USING brin (data);
+CREATE INDEX IF NOT EXISTS estoque_data_brin ON domrock.estoque USING brin (data);
+
+-- SKU + data: filtros por SKU nos relatórios e junção vendas x estoque
+CREATE INDEX IF NOT EXISTS vendas_sku_data_idx ON domrock.vendas (SKU, data);
+CREATE INDEX IF NOT EXISTS estoque_sku_data_idx ON domrock.estoque (SKU, data);
+
+-- Agrupamentos e filtros por produto, cidade e cliente
+CREATE INDEX IF NOT EXISTS vendas_produto_idx ON domrock.vendas (produto);
+CREATE INDEX IF NOT EXISTS vendas_zs_cidade_idx ON domrock.vendas (zs_cidade);
+CREATE INDEX IF NOT EXISTS vendas_cod_cliente_idx ON domrock.vendas (cod_cliente);
+CREATE INDEX IF NOT EXISTS estoque_produto_idx ON domrock.estoque (produto);
+CREATE INDEX IF NOT EXISTS estoque_cod_cliente_idx ON domrock.estoque (cod_cliente);
+
+-- Trigramas para os filtros ILIKE do chatbot (produto, cidade, SKU).
+-- pg_trgm faz parte do contrib, mas nem toda instalação o traz: sem ele
+-- a migração segue só com os índices acima.
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS vendas_produto_trgm ON domrock.vendas USING gin (produto gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS vendas_zs_cidade_trgm ON domrock.vendas USING gin (zs_cidade gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS vendas_sku_trgm ON domrock.vendas USING gin (SKU gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS estoque_produto_trgm ON domrock.estoque USING gin (produto gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS estoque_sku_trgm ON domrock.estoque USING gin (SKU gin_trgm_ops);
+    ELSE
+        RAISE NOTICE 'Extensão pg_trgm indisponível: índices de trigramas não criados';
+    END IF;
+END
+$$;
+
+ANALYZE domrock.vendas;
+ANALYZE domrock.estoque;
@@ -0,0 +1,110 @@
+-- Agregados diários e mensais de vendas e estoque para os dashboards.
+--
+-- Cada linha guarda o total de um valor de uma dimensão num dia (ou mês):
+-- dimensao = 'produto' / 'zs_cidade' / 'cod_cliente' / 'sku', ou 'total' para
+-- o dia inteiro (valor = ''). Valores NULL na tabela de origem viram ''.
+--
+-- A importação chama atualizar_rollup_<tipo>() com as datas do arquivo, e só
+-- esses dias (e os meses deles) são recalculados.
+
+CREATE TABLE IF NOT EXISTS domrock.rollup_vendas_diario (
+    data DATE NOT NULL,
+    dimensao VARCHAR(20) NOT NULL,
+    valor VARCHAR(100) NOT NULL,
+    total_peso NUMERIC,
+    linhas BIGINT NOT NULL,
+    PRIMARY KEY (dimensao, data, valor)
+);
+
+CREATE TABLE IF NOT EXISTS domrock.rollup_vendas_mensal (
+    mes DATE NOT NULL,
+    dimensao VARCHAR(20) NOT NULL,
+    valor VARCHAR(100) NOT NULL,
+    total_peso NUMERIC,
+    linhas BIGINT NOT NULL,
+    PRIMARY KEY (dimensao, mes, valor)
+);
+
+CREATE TABLE IF NOT EXISTS domrock.rollup_estoque_diario (
+    data DATE NOT NULL,
+    dimensao VARCHAR(20) NOT NULL,
+    valor VARCHAR(100) NOT NULL,
+    total_estoque NUMERIC,
+    linhas BIGINT NOT NULL,
+    PRIMARY KEY (dimensao, data, valor)
+);
+
+CREATE TABLE IF NOT EXISTS domrock.rollup_estoque_mensal (
+    mes DATE NOT NULL,
+    dimensao VARCHAR(20) NOT NULL,
+    valor VARCHAR(100) NOT NULL,
+    total_estoque NUMERIC,
+    linhas BIGINT NOT NULL,
+    PRIMARY KEY (dimensao, mes, valor)
+);
+
+CREATE OR REPLACE FUNCTION domrock.atualizar_rollup_vendas(datas DATE[])
+RETURNS void AS $$
+BEGIN
+    -- Importações simultâneas recalculam os mesmos dias uma de cada vez
+    PERFORM pg_advisory_xact_lock(hashtext('domrock.rollup_vendas'));
+
+    DELETE FROM domrock.rollup_vendas_diario WHERE data = ANY(datas);
+    INSERT INTO domrock.rollup_vendas_diario (data, dimensao, valor, total_peso, linhas)
+    SELECT data,
+           CASE WHEN GROUPING(produto) = 0 THEN 'produto'
+                WHEN GROUPING(zs_cidade) = 0 THEN 'zs_cidade'
+                WHEN GROUPING(cod_cliente) = 0 THEN 'cod_cliente'
+                WHEN GROUPING(sku) = 0 THEN 'sku'
+                ELSE 'total' END,
+           COALESCE(produto, zs_cidade, cod_cliente, sku, ''),
+           SUM(zs_peso_liquido),
+           COUNT(*)
+    FROM domrock.vendas
+    WHERE data = ANY(datas)
+    GROUP BY GROUPING SETS ((data), (data, produto), (data, zs_cidade), (data, cod_cliente), (data, sku));
+
+    DELETE FROM domrock.rollup_vendas_mensal
+    WHERE mes IN (SELECT date_trunc('month', d)::date FROM unnest(datas) d);
+    INSERT INTO domrock.rollup_vendas_mensal (mes, dimensao, valor, total_peso, linhas)
+    SELECT m.mes, r.dimensao, r.valor, SUM(r.total_peso), SUM(r.linhas)
+    FROM (SELECT DISTINCT date_trunc('month', d)::date AS mes FROM unnest(datas) d) m
+    JOIN domrock.rollup_vendas_diario r
+      ON r.data >= m.mes AND r.data < m.mes + INTERVAL '1 month'
+    GROUP BY m.mes, r.dimensao, r.valor;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION domrock.atualizar_rollup_estoque(datas DATE[])
+RETURNS void AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('domrock.rollup_estoque'));
+
+    DELETE FROM domrock.rollup_estoque_diario WHERE data = ANY(datas);
+    INSERT INTO domrock.rollup_estoque_diario (data, dimensao, valor, total_estoque, linhas)
+    SELECT data,
+           CASE WHEN GROUPING(produto) = 0 THEN 'produto'
+                WHEN GROUPING(cod_cliente) = 0 THEN 'cod_cliente'
+                WHEN GROUPING(sku) = 0 THEN 'sku'
+                ELSE 'total' END,
+           COALESCE(produto, cod_cliente, sku, ''),
+           SUM(es_totalestoque),
+           COUNT(*)
+    FROM domrock.estoque
+    WHERE data = ANY(datas)
+    GROUP BY GROUPING SETS ((data), (data, produto), (data, cod_cliente), (data, sku));
+
+    DELETE FROM domrock.rollup_estoque_mensal
+    WHERE mes IN (SELECT date_trunc('month', d)::date FROM unnest(datas) d);
+    INSERT INTO domrock.rollup_estoque_mensal (mes, dimensao, valor, total_estoque, linhas)
+    SELECT m.mes, r.dimensao, r.valor, SUM(r.total_estoque), SUM(r.linhas)
+    FROM (SELECT DISTINCT date_trunc('month', d)::date AS mes FROM unnest(datas) d) m
+    JOIN domrock.rollup_estoque_diario r
+      ON r.data >= m.mes AND r.data < m.mes + INTERVAL '1 month'
+    GROUP BY m.mes, r.dimensao, r.valor;
+END
+$$ LANGUAGE plpgsql;
+
+-- Carga inicial com o que já está no banco
+SELECT domrock.atualizar_rollup_vendas(ARRAY(SELECT DISTINCT data FROM domrock.vendas));
+SELECT domrock.atualizar_rollup_estoque(ARRAY(SELECT DISTINCT data FROM domrock.estoque));
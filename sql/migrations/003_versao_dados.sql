@@ -0,0 +1,9 @@
+-- Contador incrementado a cada importação que grava linhas; os caches
+-- (src/cache.py) usam o valor na chave para saber quando os dados mudaram.
+CREATE TABLE IF NOT EXISTS domrock.versao_dados (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),  -- uma linha só
+    versao BIGINT NOT NULL DEFAULT 0,
+    atualizado_em TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+INSERT INTO domrock.versao_dados (id) VALUES (TRUE) ON CONFLICT DO NOTHING;
@@ -0,0 +1,16 @@
+-- Relatórios de métricas já calculados (src/relatorio_snapshot.py). Um por
+-- versão dos dados e data de referência: os envios e o download reaproveitam
+-- o texto e o CSV prontos em vez de recalcular as métricas a cada pedido.
+CREATE TABLE IF NOT EXISTS domrock.relatorio_snapshots (
+    id SERIAL PRIMARY KEY,
+    versao_dados BIGINT NOT NULL,
+    data_referencia DATE NOT NULL,
+    gerado_em TIMESTAMP NOT NULL DEFAULT NOW(),
+    metricas JSONB NOT NULL,
+    texto TEXT NOT NULL,
+    csv BYTEA NOT NULL,
+    tempos_ms JSONB
+);
+
+CREATE INDEX IF NOT EXISTS idx_relatorio_snapshots_versao
+    ON domrock.relatorio_snapshots (versao_dados, data_referencia, id DESC);
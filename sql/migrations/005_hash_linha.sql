@@ -0,0 +1,43 @@
+-- Hash das colunas de negócio de cada linha: reenvios só inserem linhas novas.
+-- Em tabela grande o preenchimento abaixo demora, por isso fica aqui e não no
+-- sql/domrock.sql (que roda a cada subida do schema).
+ALTER TABLE domrock.vendas ADD COLUMN IF NOT EXISTS hash_linha CHAR(32);
+ALTER TABLE domrock.estoque ADD COLUMN IF NOT EXISTS hash_linha CHAR(32);
+-- (o hash já inclui a data; data entra na chave para valer também com vendas particionada)
+CREATE UNIQUE INDEX IF NOT EXISTS vendas_hash_linha_key ON domrock.vendas (hash_linha, data);
+CREATE UNIQUE INDEX IF NOT EXISTS estoque_hash_linha_key ON domrock.estoque (hash_linha, data);
+
+-- Preenche o hash das linhas já existentes. Duplicatas antigas ficam com
+-- hash_linha NULL (só a de menor id recebe o hash) para poderem ser revisadas.
+UPDATE domrock.vendas v SET hash_linha = h.hash_linha
+FROM (
+    SELECT DISTINCT ON (hash_linha) id_venda, hash_linha
+    FROM (
+        SELECT id_venda, md5(ROW(data, cod_cliente, cod_produto, lote, origem, zs_gr_mercad, produto,
+                                 zs_centro, zs_cidade, zs_uf, SKU, zs_peso_liquido, giro_sku_cliente)::text) AS hash_linha
+        FROM domrock.vendas
+        WHERE hash_linha IS NULL
+    ) calc
+    ORDER BY hash_linha, id_venda
+) h
+WHERE v.id_venda = h.id_venda
+  AND NOT EXISTS (SELECT 1 FROM domrock.vendas x WHERE x.hash_linha = h.hash_linha);
+
+UPDATE domrock.estoque e SET hash_linha = h.hash_linha
+FROM (
+    SELECT DISTINCT ON (hash_linha) id_estoque, hash_linha
+    FROM (
+        SELECT id_estoque, md5(ROW(data, cod_cliente, cod_produto, es_centro, tipo_material, origem, lote,
+                                   dias_em_estoque, produto, grupo_mercadoria, es_totalestoque, SKU)::text) AS hash_linha
+        FROM domrock.estoque
+        WHERE hash_linha IS NULL
+    ) calc
+    ORDER BY hash_linha, id_estoque
+) h
+WHERE e.id_estoque = h.id_estoque
+  AND NOT EXISTS (SELECT 1 FROM domrock.estoque x WHERE x.hash_linha = h.hash_linha);
+
+-- Linhas novas sempre têm hash (NULL passaria direto pela chave única).
+-- NOT VALID: as duplicatas antigas com hash NULL continuam na tabela.
+ALTER TABLE domrock.vendas ADD CONSTRAINT vendas_hash_linha_not_null CHECK (hash_linha IS NOT NULL) NOT VALID;
+ALTER TABLE domrock.estoque ADD CONSTRAINT estoque_hash_linha_not_null CHECK (hash_linha IS NOT NULL) NOT VALID;
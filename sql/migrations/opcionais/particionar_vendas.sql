@@ -0,0 +1,85 @@
+-- Particionamento mensal de domrock.vendas por data (opcional).
+-- Aplicar com: python migrar.py --opcional particionar_vendas
+--
+-- Consultas com filtro de data (últimas 52 semanas, mês) passam a ler só as
+-- partições do período. Em partições, chaves únicas precisam conter a chave
+-- de partição, então a PK vira (id_venda, data) e o índice de hash_linha vira
+-- (hash_linha, data); como o hash já inclui a data, a deduplicação da
+-- importação (ON CONFLICT DO NOTHING) continua igual.
+
+-- Cria as partições mensais que faltam entre inicio e fim.
+-- Chamada pela importação antes de gravar um arquivo com meses novos.
+CREATE OR REPLACE FUNCTION domrock.criar_particoes_vendas(inicio DATE, fim DATE)
+RETURNS void AS $$
+DECLARE
+    mes DATE := date_trunc('month', inicio);
+BEGIN
+    IF inicio IS NULL OR fim IS NULL THEN
+        RETURN;
+    END IF;
+    WHILE mes <= fim LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS domrock.%I PARTITION OF domrock.vendas FOR VALUES FROM (%L) TO (%L)',
+            'vendas_' || to_char(mes, 'YYYY_MM'), mes, (mes + INTERVAL '1 month')::date
+        );
+        mes := (mes + INTERVAL '1 month')::date;
+    END LOOP;
+END
+$$ LANGUAGE plpgsql;
+
+-- Partições por intervalo não aceitam data nula: melhor parar aqui, com a
+-- contagem, do que falhar no meio da cópia (a transação desfaz tudo)
+DO $$
+DECLARE
+    sem_data BIGINT;
+BEGIN
+    SELECT COUNT(*) INTO sem_data FROM domrock.vendas WHERE data IS NULL;
+    IF sem_data > 0 THEN
+        RAISE EXCEPTION '% linhas de domrock.vendas sem data; corrija ou remova antes de particionar', sem_data
+            USING HINT = 'SELECT * FROM domrock.vendas WHERE data IS NULL';
+    END IF;
+END
+$$;
+
+ALTER TABLE domrock.vendas RENAME TO vendas_antiga;
+
+CREATE TABLE domrock.vendas (LIKE domrock.vendas_antiga INCLUDING DEFAULTS)
+PARTITION BY RANGE (data);
+
+-- A sequência do id_venda passa para a tabela nova antes de a antiga sair
+ALTER SEQUENCE domrock.vendas_id_venda_seq OWNED BY domrock.vendas.id_venda;
+
+SELECT domrock.criar_particoes_vendas(MIN(data), MAX(data)) FROM domrock.vendas_antiga;
+
+INSERT INTO domrock.vendas SELECT * FROM domrock.vendas_antiga;
+
+-- Recria os índices secundários (migração 001 e afins) na tabela particionada
+DO $$
+DECLARE
+    indices TEXT[];
+    definicao TEXT;
+BEGIN
+    SELECT array_agg(replace(indexdef, 'domrock.vendas_antiga', 'domrock.vendas'))
+    INTO indices
+    FROM pg_indexes
+    WHERE schemaname = 'domrock'
+      AND tablename = 'vendas_antiga'
+      AND indexname NOT IN ('vendas_pkey', 'vendas_hash_linha_key');
+
+    DROP TABLE domrock.vendas_antiga;
+
+    FOREACH definicao IN ARRAY COALESCE(indices, '{}') LOOP
+        EXECUTE definicao;
+    END LOOP;
+END
+$$;
+
+ALTER TABLE domrock.vendas ADD PRIMARY KEY (id_venda, data);
+CREATE UNIQUE INDEX vendas_hash_linha_key ON domrock.vendas (hash_linha, data);
+-- LIKE não copia CHECKs: volta a exigir hash nas linhas novas (migração 005)
+ALTER TABLE domrock.vendas ADD CONSTRAINT vendas_hash_linha_not_null CHECK (hash_linha IS NOT NULL) NOT VALID;
+ALTER TABLE domrock.vendas
+    ADD FOREIGN KEY (cod_cliente) REFERENCES domrock.clientes (cod_cliente),
+    ADD FOREIGN KEY (cod_produto) REFERENCES domrock.produtos (cod_produto);
+
+ANALYZE domrock.vendas;
@@ -1,4 +1,8 @@
-from pydantic import BaseModel, EmailStr
+from typing import List
+from pydantic import BaseModel, EmailStr, Field
 
 class Email(BaseModel):
-    email: EmailStr
\ No newline at end of file
+    email: EmailStr
+
+class EmailsLote(BaseModel):
+    emails: List[EmailStr] = Field(..., min_length=1)
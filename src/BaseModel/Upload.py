@@ -2,4 +2,19 @@ from enum import Enum
 
 class Upload(str, Enum):
     vendas = "vendas"
-    estoque = "estoque"
\ No newline at end of file
+    estoque = "estoque"
+
+class ModoCarga(str, Enum):
+    copy = "copy"
+    insert = "insert"
+
+class FormatoExportacao(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+    arrow = "arrow"
+    parquet = "parquet"
+
+class FormatoRelatorio(str, Enum):
+    csv = "csv"
+    arrow = "arrow"
+    parquet = "parquet"
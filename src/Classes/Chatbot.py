@@ -1,12 +1,47 @@
-
+import os
+import threading
+import time
+from typing import TYPE_CHECKING
+from concurrent.futures.process import BrokenProcessPool
 from .Intencao import Intencao
 from .logger import log_info, log_error
-from .nlp_utils import NlpEngine
+from .agendador_nlp import AgendadorLote
+from . import processos_nlp
 from crud_dados import execute_query_from_components # Importaremos a nova função
+from cache import CacheMemoria
+
+if TYPE_CHECKING:
+    from .nlp_utils import NlpEngine
+
+# =====================
+# Cache de componentes
+# =====================
+# texto da pergunta -> componentes (intenção, filtros, n_top): pula spaCy e encoder.
+# Não depende dos dados; é limpo sempre que o motor (e as entidades do banco) recarrega.
+# O resultado das consultas fica só no cache de crud_dados (@cacheado), cuja chave
+# leva a versão dos dados.
+RESPOSTAS_CACHE_CONFIG = {
+    "max_itens": int(os.getenv("CHATBOT_CACHE_ITENS", "1024")),  # 0 desliga
+}
+_cache_componentes = CacheMemoria(RESPOSTAS_CACHE_CONFIG["max_itens"])
+_cache_stats = {"componentes_acertos": 0, "componentes_faltas": 0}
+_cache_lock = threading.Lock()
+
+
+def _contar(evento: str):
+    with _cache_lock:
+        _cache_stats[evento] += 1
+
+
+def _normalizar_pergunta(texto: str) -> str:
+    # Só junta espaços: maiúsculas e acentos mudam o que o spaCy e a regex de SKU
+    # extraem ("AB-1234" vira filtro de sku, "ab-1234" não), então ficam na chave
+    return " ".join(texto.split())
+
 
 class Chatbot:
     """Orquestra a interação entre a NLP Engine e a execução da consulta."""
-    def __init__(self, nlp_engine: NlpEngine):
+    def __init__(self, nlp_engine: "NlpEngine"):
         self.nlp_engine = nlp_engine
         log_info("Chatbot inicializado com a nova NlpEngine Híbrida.")
 
@@ -17,8 +52,16 @@ class Chatbot:
         if not user_question:
             return {"erro": "A pergunta não pode ser vazia."}, "DESCONHECIDO"
 
-        # 1. Extrair componentes da consulta usando a NlpEngine Híbrida
-        components = self.nlp_engine.predict_components(user_question)
+        # 1. Extrair componentes da consulta usando a NlpEngine Híbrida (ou do cache)
+        chave = _normalizar_pergunta(user_question)
+        components = _componentes_em_cache(chave)
+        if components is None:
+            components = _prever_lote([user_question])[0]
+            _guardar_componentes(chave, components)
+        return self.responder(components)
+
+    def responder(self, components: dict) -> tuple[dict, str]:
+        """Resposta a partir de componentes já extraídos (ex.: pelo agendador de lotes)."""
         intent_name = components["intent"].name
 
         # 2. Lidar com intenções de sistema (DESCONHECIDO, FORA_DE_ESCOPO)
@@ -47,8 +90,97 @@ class Chatbot:
             return {"erro": "Ocorreu um erro interno ao buscar os dados."}, intent_name
 
 # =====================
-# 🚀 INICIALIZAÇÃO SINGLETON
+# 🚀 INICIALIZAÇÃO SINGLETON (em segundo plano)
 # =====================
+# spaCy, SentenceTransformer e as entidades do banco levam dezenas de segundos
+# para carregar. O import deste módulo é instantâneo: a API sobe na hora e o
+# chatbot fica pronto quando o thread de iniciar() terminar.
+
+nlp_engine_instance = None
+chatbot_instance = None
+
+_estado = {"status": "parado", "erro": None, "segundos": None}
+_lock = threading.Lock()
+
+
+def _carregar():
+    inicio = time.perf_counter()
+    try:
+        global nlp_engine_instance, chatbot_instance
+        if processos_nlp.PROCESSOS_CONFIG["processos"]:
+            # O modelo fica só nos workers; este processo apenas despacha os lotes
+            processos_nlp.iniciar("../csv/perguntas.csv")
+        else:
+            from .nlp_utils import NlpEngine  # import pesado (spaCy, torch) só aqui
+            nlp_engine_instance = NlpEngine(csv_path="../csv/perguntas.csv")
+        _cache_componentes.limpar()
+        chatbot_instance = Chatbot(nlp_engine=nlp_engine_instance)
+        _estado.update(status="pronto", segundos=round(time.perf_counter() - inicio, 2))
+        log_info(f"Chatbot pronto em {_estado['segundos']}s")
+    except Exception as e:
+        _estado.update(status="erro", erro=str(e), segundos=round(time.perf_counter() - inicio, 2))
+        log_error(f"Falha ao inicializar o chatbot: {e}")
+
+
+def iniciar():
+    """Começa a carregar o chatbot num thread (chamadas repetidas não fazem nada)."""
+    with _lock:
+        if _estado["status"] != "parado":
+            return
+        _estado["status"] = "carregando"
+    threading.Thread(target=_carregar, name="chatbot-init", daemon=True).start()
+
+
+def encerrar():
+    processos_nlp.encerrar()
+
+
+def _componentes_em_cache(chave: str):
+    if not RESPOSTAS_CACHE_CONFIG["max_itens"]:
+        return None
+    components = _cache_componentes.get(chave, None)
+    _contar("componentes_faltas" if components is None else "componentes_acertos")
+    return components
+
+
+def _guardar_componentes(chave: str, components: dict):
+    if RESPOSTAS_CACHE_CONFIG["max_itens"]:
+        _cache_componentes.set(chave, components, float("inf"))
+
+
+async def prever(user_question: str) -> dict:
+    """Componentes da pergunta: do cache (texto normalizado) ou do agendador de lotes."""
+    chave = _normalizar_pergunta(user_question)
+    components = _componentes_em_cache(chave)
+    if components is None:
+        components = await agendador.prever(user_question)
+        _guardar_componentes(chave, components)
+    return components
+
+
+def estatisticas_cache() -> dict:
+    with _cache_lock:
+        stats = dict(_cache_stats)
+    stats["componentes_itens"] = len(_cache_componentes)
+    return stats
+
+
+def _prever_lote(perguntas: list) -> list:
+    if processos_nlp.ativo():
+        try:
+            return processos_nlp.prever_lote(perguntas)
+        except BrokenProcessPool:
+            # Os workers novos recarregam o motor e as entidades do banco
+            _cache_componentes.limpar()
+            raise
+    return nlp_engine_instance.predict_components_lote(perguntas)
+
+
+# Junta as perguntas de todas as sessões do websocket em micro-lotes
+# (com CHATBOT_PROCESSOS, um lote por worker ao mesmo tempo)
+agendador = AgendadorLote(_prever_lote, paralelos=processos_nlp.PROCESSOS_CONFIG["processos"] or 1)
+
 
-nlp_engine_instance = NlpEngine(csv_path="../csv/perguntas.csv")
-chatbot_instance = Chatbot(nlp_engine=nlp_engine_instance)
+def estado() -> dict:
+    """status: parado, carregando, pronto ou erro."""
+    return dict(_estado)
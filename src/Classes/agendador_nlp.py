@@ -0,0 +1,146 @@
+"""
+Micro-lotes de inferência do chatbot.
+
+Cada sessão do websocket chama `await agendador.prever(pergunta)`. As perguntas
+que chegam enquanto um lote está sendo montado (até `max_lote`, esperando no
+máximo `espera_ms` depois da primeira) são processadas juntas por uma função
+de lote (NlpEngine.predict_components_lote: um nlp.pipe e um encode), e cada
+sessão recebe o seu resultado. Com 50 pessoas perguntando ao mesmo tempo, são
+poucos passes do modelo em vez de 50.
+
+Os lotes rodam em threads próprios, `paralelos` por vez (1 quando o NLP roda
+no processo da API: o torch/ONNX já usa todos os núcleos; um por worker com
+CHATBOT_PROCESSOS), e o event loop continua livre enquanto isso.
+"""
+import asyncio
+import collections
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+LOTE_CONFIG = {
+    "max_lote": max(1, int(os.getenv("NLP_LOTE_MAXIMO", "32"))),
+    "espera_ms": max(0.0, float(os.getenv("NLP_LOTE_ESPERA_MS", "5"))),
+}
+
+
+class AgendadorLote:
+    def __init__(self, processar_lote, max_lote: int = None, espera_ms: float = None, paralelos: int = 1):
+        """processar_lote(lista de perguntas) -> lista de resultados, na mesma ordem."""
+        self.processar_lote = processar_lote
+        self.max_lote = max_lote or LOTE_CONFIG["max_lote"]
+        self.espera_ms = LOTE_CONFIG["espera_ms"] if espera_ms is None else espera_ms
+        self.paralelos = max(1, paralelos)
+        self._executor = ThreadPoolExecutor(max_workers=self.paralelos, thread_name_prefix="nlp-lote")
+        self._fila = None
+        self._tarefa = None
+        self._loop = None
+        self._stats_lock = threading.Lock()
+        self._stats = {"lotes": 0, "mensagens": 0, "maior_lote": 0, "espera_ms_total": 0.0, "lote_ms_total": 0.0,
+                       "em_andamento": 0}
+        self._latencias_ms = collections.deque(maxlen=1000)  # da chegada ao resultado, por pergunta
+
+    def _garantir_tarefa(self):
+        # Criada no primeiro uso, no loop de quem chamou (o do uvicorn)
+        loop = asyncio.get_running_loop()
+        if self._tarefa is None or self._tarefa.done() or self._loop is not loop:
+            self._loop = loop
+            self._fila = asyncio.Queue()
+            self._tarefa = loop.create_task(self._consumir())
+
+    async def prever(self, pergunta: str):
+        self._garantir_tarefa()
+        futuro = self._loop.create_future()
+        await self._fila.put((pergunta, futuro, time.perf_counter()))
+        return await futuro
+
+    async def _montar_lote(self) -> list:
+        lote = [await self._fila.get()]
+        prazo = self._loop.time() + self.espera_ms / 1000
+        while len(lote) < self.max_lote:
+            restante = prazo - self._loop.time()
+            if restante <= 0:
+                # Prazo acabou: ainda leva o que já está na fila, sem esperar mais
+                while len(lote) < self.max_lote and not self._fila.empty():
+                    lote.append(self._fila.get_nowait())
+                break
+            try:
+                lote.append(await asyncio.wait_for(self._fila.get(), restante))
+            except asyncio.TimeoutError:
+                break
+        return lote
+
+    async def _consumir(self):
+        vagas = asyncio.Semaphore(self.paralelos)
+        while True:
+            # Com todas as vagas ocupadas as perguntas se acumulam na fila e o próximo lote sai maior
+            await vagas.acquire()
+            lote = await self._montar_lote()
+            # Sessão que desconectou enquanto esperava: não entra no lote
+            lote = [item for item in lote if not item[1].done()]
+            if not lote:
+                vagas.release()
+                continue
+            tarefa = self._loop.create_task(self._processar(lote))
+            tarefa.add_done_callback(lambda _: vagas.release())
+
+    async def _processar(self, lote: list):
+        inicio = time.perf_counter()
+        perguntas = [pergunta for pergunta, _, _ in lote]
+        with self._stats_lock:
+            self._stats["em_andamento"] += 1
+        try:
+            resultados = await self._loop.run_in_executor(self._executor, self.processar_lote, perguntas)
+        except Exception as e:
+            for _, futuro, _ in lote:
+                if not futuro.done():
+                    futuro.set_exception(e)
+            return
+        finally:
+            with self._stats_lock:
+                self._stats["em_andamento"] -= 1
+        fim = time.perf_counter()
+
+        for (_, futuro, _), resultado in zip(lote, resultados):
+            if not futuro.done():
+                futuro.set_result(resultado)
+        with self._stats_lock:
+            self._stats["lotes"] += 1
+            self._stats["mensagens"] += len(lote)
+            self._stats["maior_lote"] = max(self._stats["maior_lote"], len(lote))
+            self._stats["espera_ms_total"] += sum(inicio - chegada for _, _, chegada in lote) * 1000
+            self._stats["lote_ms_total"] += (fim - inicio) * 1000
+            self._latencias_ms.extend((fim - chegada) * 1000 for _, _, chegada in lote)
+
+    async def encerrar(self):
+        if self._tarefa is not None and not self._tarefa.done():
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+        self._tarefa = None
+
+    def estatisticas(self) -> dict:
+        with self._stats_lock:
+            s = dict(self._stats)
+            latencias = sorted(self._latencias_ms)
+        return {
+            "max_lote": self.max_lote,
+            "espera_ms": self.espera_ms,
+            "paralelos": self.paralelos,
+            # Perguntas esperando um lote e lotes rodando agora
+            "fila": self._fila.qsize() if self._fila is not None else 0,
+            "em_andamento": s["em_andamento"],
+            "lotes": s["lotes"],
+            "mensagens": s["mensagens"],
+            "maior_lote": s["maior_lote"],
+            "media_por_lote": round(s["mensagens"] / s["lotes"], 2) if s["lotes"] else None,
+            # Tempo na fila até o lote começar, e duração média de cada lote
+            "espera_ms_media": round(s["espera_ms_total"] / s["mensagens"], 2) if s["mensagens"] else None,
+            "lote_ms_medio": round(s["lote_ms_total"] / s["lotes"], 2) if s["lotes"] else None,
+            "resposta_ms_mediana": round(statistics.median(latencias), 2) if latencias else None,
+            "resposta_ms_p95": round(latencias[max(0, int(len(latencias) * 0.95) - 1)], 2) if latencias else None,
+        }
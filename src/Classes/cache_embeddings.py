@@ -0,0 +1,60 @@
+"""
+Cache em disco dos embeddings das perguntas de treino (csv/perguntas.csv).
+
+Os embeddings ficam num .npy cujo nome leva o modelo e o hash das perguntas:
+enquanto nenhum dos dois mudar, a subida só abre o arquivo com mmap (sem
+reencodar nada), e os workers do uvicorn compartilham as mesmas páginas do
+cache do sistema operacional em vez de cada um guardar a sua cópia.
+"""
+import hashlib
+import os
+import re
+from pathlib import Path
+import numpy as np
+from .logger import log_info
+
+PASTA_EMBEDDINGS = Path(os.getenv("EMBEDDINGS_CACHE_PASTA", "../csv/embeddings/"))
+# Mudou a forma de gerar (ex.: normalização)? Incremente para invalidar os arquivos antigos
+VERSAO_FORMATO = 1
+
+
+def chave(model_name: str, perguntas: list) -> str:
+    h = hashlib.sha256(f"v{VERSAO_FORMATO}\n{model_name}\n".encode("utf-8"))
+    for pergunta in perguntas:
+        h.update(pergunta.encode("utf-8"))
+        h.update(b"\n")
+    return h.hexdigest()[:16]
+
+
+def _prefixo(model_name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+
+
+def carregar_ou_gerar(model_name: str, perguntas: list, encode) -> np.ndarray:
+    """
+    Matriz (perguntas x dimensões) de embeddings normalizados, em float32 e
+    somente leitura. encode(lista de textos) só é chamado quando o arquivo da
+    combinação modelo + perguntas ainda não existe.
+    """
+    caminho = PASTA_EMBEDDINGS / f"{_prefixo(model_name)}_{chave(model_name, perguntas)}.npy"
+    if caminho.exists():
+        embeddings = np.load(caminho, mmap_mode="r")
+        if embeddings.shape[0] == len(perguntas):
+            log_info(f"Embeddings carregados do cache: {caminho.name}")
+            return embeddings
+
+    log_info(f"Gerando embeddings de {len(perguntas)} perguntas com {model_name}...")
+    embeddings = np.asarray(encode(perguntas), dtype=np.float32)
+    normas = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    embeddings = embeddings / np.where(normas == 0, 1, normas)
+
+    # Grava num temporário e troca de uma vez: outro worker nunca lê um arquivo pela metade
+    PASTA_EMBEDDINGS.mkdir(parents=True, exist_ok=True)
+    temporario = caminho.with_name(f"{caminho.stem}.{os.getpid()}.tmp.npy")
+    np.save(temporario, embeddings)
+    os.replace(temporario, caminho)
+    for antigo in PASTA_EMBEDDINGS.glob(f"{_prefixo(model_name)}_*.npy"):
+        if antigo != caminho and ".tmp" not in antigo.name:
+            antigo.unlink(missing_ok=True)
+
+    return np.load(caminho, mmap_mode="r")
@@ -0,0 +1,81 @@
+"""
+Backend do encoder de frases do NlpEngine (all-MiniLM-L6-v2).
+
+- torch:     SentenceTransformer de sempre, em PyTorch.
+- onnx:      mesmo modelo exportado para ONNX e executado pelo ONNX Runtime.
+- onnx-int8: ONNX com quantização dinâmica int8 (pesos em 8 bits), o mais
+             leve em CPU e em memória por worker.
+
+Os arquivos ONNX são gerados uma vez em NLP_ONNX_PASTA e reaproveitados nas
+próximas subidas (onnxruntime e optimum estão no requirements.txt). Se o
+backend pedido não carregar, o erro sobe e o chatbot fica com status "erro":
+quem escolheu ONNX não passa a rodar em torch sem perceber.
+"""
+import os
+import re
+from pathlib import Path
+from sentence_transformers import SentenceTransformer
+from .logger import log_info
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+ENCODER_CONFIG = {
+    "backend": os.getenv("NLP_ENCODER_BACKEND", "torch").lower(),
+    "pasta": Path(os.getenv("NLP_ONNX_PASTA", "../csv/onnx/")),
+    # Conjunto de instruções usado na quantização: arm64, avx2, avx512 ou avx512_vnni
+    "quantizacao": os.getenv("NLP_ONNX_QUANTIZACAO", "avx2"),
+}
+
+
+def identificador(model_name: str, backend: str) -> str:
+    """Nome do modelo + backend, usado na chave do cache de embeddings (int8 gera vetores diferentes)."""
+    return model_name if backend == "torch" else f"{model_name}-{backend}"
+
+
+def _pasta_modelo(model_name: str) -> Path:
+    return ENCODER_CONFIG["pasta"] / re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+
+
+def _arquivo_onnx(backend: str) -> str:
+    if backend == "onnx":
+        return "onnx/model.onnx"
+    return f"onnx/model_qint8_{ENCODER_CONFIG['quantizacao']}.onnx"
+
+
+def exportar_onnx(model_name: str, backend: str) -> Path:
+    """Exporta (uma vez) o modelo para ONNX e, no onnx-int8, gera a versão quantizada."""
+    pasta = _pasta_modelo(model_name)
+    arquivo = pasta / _arquivo_onnx(backend)
+    if arquivo.exists():
+        return pasta
+
+    if not (pasta / "onnx" / "model.onnx").exists():
+        log_info(f"Exportando {model_name} para ONNX em {pasta}...")
+        SentenceTransformer(model_name, backend="onnx").save_pretrained(str(pasta))
+
+    if backend == "onnx-int8":
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+        log_info(f"Quantizando {model_name} para int8 ({ENCODER_CONFIG['quantizacao']})...")
+        modelo = SentenceTransformer(str(pasta), backend="onnx")
+        export_dynamic_quantized_onnx_model(modelo, ENCODER_CONFIG["quantizacao"], str(pasta))
+
+    if not arquivo.exists():
+        raise RuntimeError(f"A exportação não gerou {arquivo}")
+    return pasta
+
+
+def carregar(model_name: str, backend: str = None):
+    """(SentenceTransformer, backend). Falha ao carregar um backend ONNX levanta RuntimeError."""
+    backend = backend or ENCODER_CONFIG["backend"]
+    if backend not in BACKENDS:
+        raise ValueError(f"NLP_ENCODER_BACKEND inválido: {backend!r} (use {', '.join(BACKENDS)})")
+    if backend == "torch":
+        return SentenceTransformer(model_name), backend
+
+    try:
+        pasta = exportar_onnx(model_name, backend)
+        modelo = SentenceTransformer(str(pasta), backend="onnx", model_kwargs={"file_name": _arquivo_onnx(backend)})
+    except Exception as e:
+        raise RuntimeError(f"Backend {backend} do encoder indisponível: {e}") from e
+    log_info(f"Encoder {model_name} rodando em ONNX Runtime ({backend})")
+    return modelo, backend
@@ -0,0 +1,157 @@
+"""
+NlpEngine em processos separados (CHATBOT_PROCESSOS > 0).
+
+Cada worker carrega o spaCy e o encoder uma vez (no initializer) e atende
+lotes de perguntas vindos do agendador (agendador_nlp). Como o NLP não roda
+mais no processo da API, ele não disputa o GIL com os outros sockets e
+requisições HTTP, e vários lotes rodam ao mesmo tempo, um por núcleo.
+
+Os embeddings das perguntas de treino vêm do cache .npy com mmap
+(cache_embeddings): os workers compartilham as mesmas páginas na memória em
+vez de cada um guardar uma cópia. O primeiro worker sobe sozinho para gerar
+esse cache (e o export ONNX, se for o caso); os demais só leem.
+"""
+import collections
+import multiprocessing
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from .logger import log_info, log_error
+
+PROCESSOS_CONFIG = {
+    "processos": max(0, int(os.getenv("CHATBOT_PROCESSOS", "0"))),
+}
+
+_executor = None
+_csv_path = None
+_pids = set()
+_lock = threading.Lock()
+_stats = {"lotes": 0, "mensagens": 0, "erros": 0, "reinicios": 0, "em_andamento": 0,
+          "camadas": collections.Counter()}
+_latencias_ms = collections.deque(maxlen=1000)  # últimos lotes, para mediana/p95
+
+_motor = None  # NlpEngine do processo worker
+
+
+def _iniciar_worker(csv_path: str):
+    """Roda uma vez em cada processo worker."""
+    global _motor
+    from .nlp_utils import NlpEngine
+    _motor = NlpEngine(csv_path=csv_path)
+
+
+def _pid(barreira=None) -> int:
+    if barreira is not None:
+        # Cada worker segura uma tarefa até todos chegarem: garante que todos carregaram
+        barreira.wait(timeout=600)
+    return os.getpid()
+
+
+def _prever_no_worker(perguntas: list) -> list:
+    return _motor.predict_components_lote(perguntas)
+
+
+def ativo() -> bool:
+    return _executor is not None
+
+
+def _novo_executor():
+    # spawn: não herda threads/conexões do processo da API
+    contexto = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(
+        max_workers=PROCESSOS_CONFIG["processos"], mp_context=contexto,
+        initializer=_iniciar_worker, initargs=(_csv_path,),
+    )
+
+
+def iniciar(csv_path: str):
+    """Sobe os workers e espera todos carregarem o modelo (chamar fora do event loop)."""
+    global _executor, _csv_path
+    with _lock:
+        if _executor is not None:
+            return
+        _csv_path = csv_path
+        executor = _novo_executor()
+    manager = multiprocessing.get_context("spawn").Manager()
+    try:
+        # Um worker primeiro (gera os caches em disco); depois os demais, que só leem
+        executor.submit(_pid).result()
+        barreira = manager.Barrier(PROCESSOS_CONFIG["processos"])
+        tarefas = [executor.submit(_pid, barreira) for _ in range(PROCESSOS_CONFIG["processos"])]
+        _pids.update(f.result() for f in tarefas)
+    except Exception:
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    finally:
+        manager.shutdown()
+    with _lock:
+        _executor = executor
+    log_info(f"NlpEngine rodando em {len(_pids)} processos")
+
+
+def encerrar():
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+        _pids.clear()
+
+
+def _reiniciar(quebrado):
+    """Worker morreu (ex.: falta de memória): troca o pool; os novos carregam o modelo no 1º lote."""
+    global _executor
+    with _lock:
+        if _executor is not quebrado:
+            return  # outro thread já trocou
+        _executor = _novo_executor()
+        _pids.clear()
+        _stats["reinicios"] += 1
+    quebrado.shutdown(wait=False, cancel_futures=True)
+    log_error("Processo do NlpEngine caiu; pool de workers reiniciado")
+
+
+def prever_lote(perguntas: list) -> list:
+    """predict_components_lote num dos workers. Bloqueia: chamar de um thread (o agendador faz isso)."""
+    executor = _executor
+    inicio = time.perf_counter()
+    with _lock:
+        _stats["em_andamento"] += 1
+    try:
+        resultados = executor.submit(_prever_no_worker, perguntas).result()
+    except BrokenProcessPool:
+        with _lock:
+            _stats["erros"] += 1
+        _reiniciar(executor)
+        raise
+    except Exception:
+        with _lock:
+            _stats["erros"] += 1
+        raise
+    finally:
+        with _lock:
+            _stats["em_andamento"] -= 1
+
+    with _lock:
+        _stats["lotes"] += 1
+        _stats["mensagens"] += len(perguntas)
+        _stats["camadas"].update(c.get("camada") for c in resultados)
+        _latencias_ms.append((time.perf_counter() - inicio) * 1000)
+    return resultados
+
+
+def estatisticas() -> dict:
+    with _lock:
+        latencias = sorted(_latencias_ms)
+        s = {k: (dict(v) if isinstance(v, collections.Counter) else v) for k, v in _stats.items()}
+        pids = sorted(_pids)
+    return {
+        "processos": PROCESSOS_CONFIG["processos"],
+        "pids": pids,
+        **s,
+        "lote_ms_mediana": round(statistics.median(latencias), 2) if latencias else None,
+        "lote_ms_p95": round(latencias[max(0, int(len(latencias) * 0.95) - 1)], 2) if latencias else None,
+    }
@@ -0,0 +1,217 @@
+"""
+Motor analítico em processo para as consultas do chatbot (QUERY_CONFIG).
+
+Com ANALITICO_ATIVO=true, vendas e estoque são exportados para arquivos
+Parquet locais (um por versão dos dados, ex.: vendas_v12.parquet) e carregados
+em memória como tabelas Arrow, com as colunas de texto em dicionário. SUM,
+COUNT(DISTINCT) e GROUP BY top-N com os filtros do chatbot rodam vetorizados
+no pyarrow, sem ida ao Postgres.
+
+Se o snapshot ainda não é da versão atual dos dados (acabou de ter importação,
+ou ainda está sendo gerado), agregar() retorna None e quem chamou usa o SQL de
+sempre; o snapshot novo é gerado em segundo plano.
+"""
+import os
+import threading
+from pathlib import Path
+import cache
+import exportar
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pc = pq = None
+
+ANALITICO_CONFIG = {
+    "ativo": os.getenv("ANALITICO_ATIVO", "false").lower() == "true",
+    "pasta": Path(os.getenv("ANALITICO_PASTA", "../csv/analitico/")),
+}
+
+# Colunas carregadas em memória (as que os filtros e agregações do chatbot usam)
+COLUNAS_TEXTO = {
+    "vendas": ["produto", "zs_cidade", "sku", "cod_cliente"],
+    "estoque": ["produto", "sku", "cod_cliente"],
+}
+COLUNAS_VALOR = {
+    "vendas": ["zs_peso_liquido"],
+    "estoque": ["es_totalestoque"],
+}
+
+_tabelas = {}  # tipo -> (versão dos dados, pa.Table)
+_lock = threading.Lock()
+_gerando = set()  # tipos com snapshot sendo gerado neste processo
+
+
+def disponivel() -> bool:
+    return ANALITICO_CONFIG["ativo"] and pa is not None
+
+
+def _caminho(tipo: str, versao: int) -> Path:
+    return ANALITICO_CONFIG["pasta"] / f"{tipo}_v{versao}.parquet"
+
+
+def gerar_snapshot(tipo: str, versao: int = None) -> Path:
+    """
+    Exporta a tabela para Parquet. A versão é lida antes da exportação: se uma
+    importação terminar no meio, o arquivo fica com a versão antiga e é
+    refeito na próxima consulta (nunca o contrário).
+    """
+    versao = cache.versao_dados() if versao is None else versao
+    destino = _caminho(tipo, versao)
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    temporario = destino.with_name(f"{destino.name}.{os.getpid()}.tmp")
+    with open(temporario, "wb") as arquivo:
+        for pedaco in exportar.exportar(tipo, "parquet"):
+            arquivo.write(pedaco)
+    os.replace(temporario, destino)
+
+    # Só versões anteriores: outro processo pode ter acabado de gravar uma mais nova
+    for antigo in destino.parent.glob(f"{tipo}_v*.parquet"):
+        versao_antiga = antigo.name[len(f"{tipo}_v"):-len(".parquet")]
+        if versao_antiga.isdigit() and int(versao_antiga) < versao:
+            antigo.unlink(missing_ok=True)
+    return destino
+
+
+def _carregar(tipo: str, caminho: Path):
+    tabela = pq.read_table(
+        caminho,
+        columns=COLUNAS_TEXTO[tipo] + COLUNAS_VALOR[tipo],
+        read_dictionary=COLUNAS_TEXTO[tipo],
+    )
+    return tabela.combine_chunks()
+
+
+def _gerar_e_carregar(tipo: str, versao: int):
+    try:
+        caminho = gerar_snapshot(tipo, versao)
+        tabela = _carregar(tipo, caminho)
+        with _lock:
+            _tabelas[tipo] = (versao, tabela)
+        print(f"Snapshot analítico de {tipo} pronto (versão {versao}, {tabela.num_rows} linhas)")
+    except Exception as e:
+        print(f"Erro ao gerar o snapshot analítico de {tipo}: {e}")
+    finally:
+        with _lock:
+            _gerando.discard(tipo)
+
+
+def _agendar(tipo: str, versao: int):
+    with _lock:
+        if tipo in _gerando:
+            return
+        _gerando.add(tipo)
+    threading.Thread(target=_gerar_e_carregar, args=(tipo, versao), name=f"analitico-{tipo}", daemon=True).start()
+
+
+def tabela(tipo: str):
+    """Tabela Arrow da versão atual dos dados, ou None se ainda não existe (já agendada)."""
+    versao = cache.versao_dados()
+    atual = _tabelas.get(tipo)
+    if atual is not None and atual[0] == versao:
+        return atual[1]
+
+    caminho = _caminho(tipo, versao)
+    if caminho.exists():
+        # Gerado por outro processo da API
+        try:
+            carregada = _carregar(tipo, caminho)
+        except (OSError, pa.ArrowInvalid):
+            carregada = None  # arquivo removido/substituído no meio da leitura
+        if carregada is not None:
+            with _lock:
+                _tabelas[tipo] = (versao, carregada)
+            return carregada
+
+    _agendar(tipo, versao)
+    return None
+
+
+def atualizar(tipos=("vendas", "estoque")):
+    """Agenda os snapshots da versão atual (na subida da API e depois de cada importação)."""
+    if not disponivel():
+        return
+    for tipo in tipos:
+        try:
+            tabela(tipo)
+        except Exception as e:
+            print(f"Snapshot analítico de {tipo} indisponível: {e}")
+
+
+def _mascara(coluna, valor: str, exato: bool):
+    """
+    Filtro numa coluna em dicionário: o LIKE roda só nos valores distintos e o
+    resultado é espalhado para as linhas pelos índices.
+    """
+    mascaras = []
+    for pedaco in coluna.chunks:
+        if exato:
+            por_codigo = pc.equal(pedaco.dictionary, valor)
+        else:
+            # Mesma semântica do ILIKE (inclusive % e _ como curingas)
+            por_codigo = pc.match_like(pedaco.dictionary, valor, ignore_case=True)
+        por_codigo = por_codigo.fill_null(False)
+        codigos = pc.indices_nonzero(por_codigo)
+        if len(codigos) <= 1:
+            # Caso comum (um ou nenhum valor casou): comparação direta com o código
+            codigo = codigos[0].as_py() if len(codigos) else -1
+            mascaras.append(pc.equal(pedaco.indices, pa.scalar(codigo, pedaco.indices.type)).fill_null(False))
+        else:
+            mascaras.append(pc.take(por_codigo, pedaco.indices).fill_null(False))
+    return pa.chunked_array(mascaras, type=pa.bool_())
+
+
+def agregar(config: dict, filtros: list, n_top: int = 5):
+    """
+    Resultado de uma consulta do QUERY_CONFIG no mesmo formato do
+    cursor.fetchall() do SQL, ou None para usar o SQL (motor desligado,
+    snapshot desatualizado ou consulta que o motor não sabe fazer).
+    """
+    if not disponivel() or config["agg_func"] not in ("SUM", "COUNT"):
+        return None
+    tipo = config["table"]
+    dados = tabela(tipo)
+    if dados is None:
+        return None
+
+    coluna_agg = config["agg_column"].lower()
+    coluna_grupo = config.get("group_by")
+    if coluna_agg not in dados.column_names or (coluna_grupo and coluna_grupo not in dados.column_names):
+        return None
+
+    mascara = None
+    for f in filtros:
+        coluna = f["column"].lower()
+        if coluna not in COLUNAS_TEXTO[tipo]:
+            return None
+        valor = str(f["value"])
+        # Mesmo critério do build_query: valor numérico usa =, texto usa ILIKE
+        m = _mascara(dados[coluna], valor, exato=valor.isnumeric())
+        mascara = m if mascara is None else pc.and_(mascara, m)
+    # Só as colunas do resultado passam pelo filtro
+    dados = dados.select([coluna_grupo, coluna_agg] if coluna_grupo else [coluna_agg])
+    if mascara is not None:
+        dados = dados.filter(mascara)
+
+    if coluna_grupo:
+        if config["agg_func"] != "SUM":
+            return None
+        agrupado = dados.group_by(coluna_grupo).aggregate([(coluna_agg, "sum")])
+        total = f"{coluna_agg}_sum"
+        # ORDER BY total DESC do Postgres põe os NULL primeiro
+        agrupado = agrupado.append_column("_nulo", pc.is_null(agrupado[total]))
+        ordem = pc.sort_indices(agrupado, sort_keys=[("_nulo", "descending"), (total, "descending")])
+        topo = agrupado.take(ordem[:n_top])
+        return list(zip(topo[coluna_grupo].to_pylist(), topo[total].to_pylist()))
+
+    if config["agg_func"] == "SUM":
+        return [(pc.sum(dados[coluna_agg]).as_py(),)]
+    if config.get("default_distinct"):
+        coluna = dados[coluna_agg]
+        if pa.types.is_dictionary(coluna.type):
+            # count_distinct não aceita dicionário: decodifica só os valores distintos
+            coluna = pc.unique(coluna).dictionary_decode()
+        return [(pc.count_distinct(coluna, mode="only_valid").as_py(),)]
+    return [(pc.count(dados[coluna_agg], mode="only_valid").as_py(),)]
@@ -0,0 +1,64 @@
+"""
+Avalia a 1ª camada do classificador de intenções do chatbot (TF-IDF +
+regressão logística, a mesma do NlpEngine) com validação cruzada em
+csv/perguntas.csv: para cada limiar, quantas perguntas ela resolveria sozinha
+(cobertura) e quantas dessas acertaria (precisão). O resto cai para os
+embeddings. Ajuda a escolher NLP_LIMIAR_LEXICO; não carrega spaCy nem torch.
+
+Uso (dentro de src/):
+    python -m benchmarks.avaliar_classificador
+    python -m benchmarks.avaliar_classificador --limiares 0.5 0.6 0.7 0.8 0.9 --folds 10
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import StratifiedKFold
+
+
+def probabilidades_fora_da_amostra(perguntas, intents, folds: int):
+    """(probabilidade máxima, intenção prevista) de cada pergunta, por um modelo que não a viu."""
+    confianca = np.zeros(len(perguntas))
+    previstas = np.empty(len(perguntas), dtype=object)
+    for treino, teste in StratifiedKFold(n_splits=folds, shuffle=True, random_state=0).split(perguntas, intents):
+        vectorizer = TfidfVectorizer()
+        modelo = LogisticRegression(C=10, max_iter=2000)
+        modelo.fit(vectorizer.fit_transform(perguntas[treino]), intents[treino])
+        probabilidades = modelo.predict_proba(vectorizer.transform(perguntas[teste]))
+        confianca[teste] = probabilidades.max(axis=1)
+        previstas[teste] = modelo.classes_[probabilidades.argmax(axis=1)]
+    return confianca, previstas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default="../csv/perguntas.csv")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--limiares", type=float, nargs="+", default=[0.5, 0.6, 0.7, 0.8, 0.9])
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.csv)
+    perguntas, intents = df["pergunta"].to_numpy(), df["intent"].to_numpy()
+    confianca, previstas = probabilidades_fora_da_amostra(perguntas, intents, args.folds)
+    print(f"{len(df)} perguntas, {df['intent'].nunique()} intenções, {args.folds} folds")
+    print(f"{'limiar':>7} {'cobertura':>10} {'precisão':>9}")
+    for limiar in args.limiares:
+        resolvidas = confianca >= limiar
+        cobertura = resolvidas.mean() * 100
+        precisao = (previstas[resolvidas] == intents[resolvidas]).mean() * 100 if resolvidas.any() else float("nan")
+        print(f"{limiar:>7.2f} {cobertura:>9.1f}% {precisao:>8.1f}%")
+
+    # Custo por mensagem da 1ª camada (o que deixa de pagar o forward do MiniLM)
+    vectorizer = TfidfVectorizer()
+    modelo = LogisticRegression(C=10, max_iter=2000).fit(vectorizer.fit_transform(perguntas), intents)
+    inicio = time.perf_counter()
+    for pergunta in perguntas:
+        modelo.predict_proba(vectorizer.transform([pergunta]))
+    ms = (time.perf_counter() - inicio) * 1000 / len(perguntas)
+    print(f"camada léxica: {ms:.2f} ms por mensagem")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Compara linhas/s do tratar_dados atual com a implementação anterior
+(coluna a coluna, operações de string linha a linha) usando os CSVs de exemplo.
+
+Uso (dentro de src/):
+    python -m benchmarks.bench_normalizar
+    python -m benchmarks.bench_normalizar --multiplicar 20 --repeticoes 5
+"""
+import argparse
+import time
+import pandas as pd
+from normalizar import tratar_dados
+
+ARQUIVOS = {
+    "vendas": "../csv/faturamento 1.csv",
+    "estoque": "../csv/estoque 1.csv",
+}
+
+
+def tratar_dados_anterior(df, tipo: str):
+    """Cópia da implementação anterior, mantida só para comparação."""
+    df = df.drop_duplicates().copy()
+
+    if "data" in df.columns:
+        df["data"] = pd.to_datetime(df["data"], errors='coerce')
+
+    for col in df.columns:
+        if df[col].dtype == "object":
+            df[col] = df[col].fillna("NA")
+        else:
+            df[col] = df[col].fillna(0)
+
+    text_cols = [
+        "produto", "origem", "zs_gr_mercad", "zs_cidade", "zs_uf", "SKU",
+        "tipo_material", "grupo_mercadoria"
+    ]
+    for col in text_cols:
+        if col in df.columns:
+            df[col] = df[col].astype(str).str.strip().str.title()
+
+    if "cod_cliente" in df.columns:
+        df["cod_cliente"] = df["cod_cliente"].astype(str).str.zfill(5)
+    if "cod_produto" in df.columns:
+        df["cod_produto"] = df["cod_produto"].astype(str).str.strip().str.upper()
+    if "zs_centro" in df.columns:
+        df["zs_centro"] = df["zs_centro"].astype(str).str.strip().str.upper()
+    if "es_centro" in df.columns:
+        df["es_centro"] = df["es_centro"].astype(str).str.strip().str.upper()
+
+    if tipo == "estoque":
+        df["es_totalestoque"] = pd.to_numeric(df["es_totalestoque"], errors="coerce").fillna(0)
+        df["dias_em_estoque"] = pd.to_numeric(df["dias_em_estoque"], errors="coerce").fillna(0).astype(int)
+    elif tipo == "vendas":
+        df["giro_sku_cliente"] = pd.to_numeric(df["giro_sku_cliente"], errors="coerce").fillna(0)
+        df["zs_peso_liquido"] = pd.to_numeric(df["zs_peso_liquido"], errors="coerce").fillna(0)
+
+    return df
+
+
+def medir(funcao, df, tipo, repeticoes):
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao(df, tipo)
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return len(df) / melhor, melhor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--multiplicar", type=int, default=1, help="repete o CSV N vezes para simular arquivos maiores")
+    args = parser.parse_args()
+
+    print(f"{'tipo':<8} {'linhas':>9} {'anterior (linhas/s)':>20} {'atual (linhas/s)':>18} {'ganho':>7}  iguais")
+    for tipo, caminho in ARQUIVOS.items():
+        df = pd.read_csv(caminho, sep="|")
+        if args.multiplicar > 1:
+            # Linhas repetidas seriam descartadas pelo drop_duplicates; varia o lote
+            copias = [df.assign(lote=df["lote"].astype(str) + f"-{i}") for i in range(args.multiplicar)]
+            df = pd.concat(copias, ignore_index=True)
+
+        taxa_anterior, _ = medir(tratar_dados_anterior, df, tipo, args.repeticoes)
+        taxa_atual, _ = medir(tratar_dados, df, tipo, args.repeticoes)
+
+        iguais = (
+            tratar_dados_anterior(df, tipo).astype(str).reset_index(drop=True)
+            .equals(tratar_dados(df, tipo).astype(str).reset_index(drop=True))
+        )
+        print(f"{tipo:<8} {len(df):>9} {taxa_anterior:>20,.0f} {taxa_atual:>18,.0f} {taxa_atual / taxa_anterior:>6.1f}x  {iguais}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Compara linhas/s da serialização das listagens: o caminho anterior (um modelo
+pydantic por linha + response_model do FastAPI validando e serializando de
+novo) contra as linhas do banco codificadas direto pelo orjson (respostas.py).
+
+As linhas são buscadas uma vez só; o que se mede é o trabalho de CPU de cada
+requisição, passando pelo FastAPI de verdade (TestClient).
+
+Uso (dentro de src/):
+    python -m benchmarks.bench_serializacao
+    python -m benchmarks.bench_serializacao --tipo estoque --linhas 1000 --repeticoes 50
+"""
+import argparse
+import asyncio
+import time
+from typing import List
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from BaseModel.Dados import Venda, Estoque
+from crud_dados import COLUNAS_VENDAS, COLUNAS_ESTOQUE
+from db import get_async_connection, fechar_pool_async
+from respostas import RespostaJSON
+
+TABELAS = {
+    "vendas": (Venda, COLUNAS_VENDAS, "id_venda"),
+    "estoque": (Estoque, COLUNAS_ESTOQUE, "id_estoque"),
+}
+
+
+async def buscar(tipo: str, linhas: int) -> list:
+    _, colunas, coluna_id = TABELAS[tipo]
+    async with get_async_connection() as connection:
+        rows = await connection.fetch(f"SELECT {colunas} FROM domrock.{tipo} ORDER BY {coluna_id} LIMIT $1", linhas)
+    await fechar_pool_async()
+    return rows
+
+
+def montar_app(modelo, rows: list) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/antes", response_model=List[modelo])
+    def antes():
+        return [modelo(**dict(row)) for row in rows]
+
+    @app.get("/depois", response_model=List[modelo])
+    def depois():
+        return RespostaJSON([dict(row) for row in rows])
+
+    return app
+
+
+def medir(cliente: TestClient, rota: str, repeticoes: int) -> float:
+    cliente.get(rota)  # aquecimento
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        cliente.get(rota).raise_for_status()
+    return time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tipo", choices=list(TABELAS), default="vendas")
+    parser.add_argument("--linhas", type=int, default=1000, help="linhas por resposta")
+    parser.add_argument("--repeticoes", type=int, default=50)
+    args = parser.parse_args()
+
+    rows = asyncio.run(buscar(args.tipo, args.linhas))
+    if not rows:
+        print(f"domrock.{args.tipo} está vazia: importe um CSV antes de medir.")
+        return
+
+    cliente = TestClient(montar_app(TABELAS[args.tipo][0], rows))
+    respostas = {rota: cliente.get(rota).json() for rota in ("/antes", "/depois")}
+    if respostas["/antes"] != respostas["/depois"]:
+        print("Atenção: as duas respostas diferem!")
+
+    tempos = {rota: medir(cliente, rota, args.repeticoes) for rota in ("/antes", "/depois")}
+    total = len(rows) * args.repeticoes
+    for rota, nome in (("/antes", "pydantic + response_model"), ("/depois", "orjson direto")):
+        print(f"{nome:<28} {total / tempos[rota]:>12,.0f} linhas/s")
+    print(f"ganho: {tempos['/antes'] / tempos['/depois']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Compara os backends do encoder do chatbot (torch, onnx, onnx-int8) em
+latência, memória e acerto de intenção nas perguntas de csv/perguntas.csv.
+
+Cada backend roda num interpretador novo (a memória de um não contamina o
+outro). O acerto é medido por vizinho mais próximo deixando a própria
+pergunta de fora: a intenção prevista é a da pergunta de treino mais parecida,
+que é o que a 2ª camada do NlpEngine faz. "concorda" é a fração de perguntas em
+que o backend prevê a mesma intenção que o torch.
+
+Uso (dentro de src/):
+    python -m benchmarks.comparar_encoders
+    python -m benchmarks.comparar_encoders --backends torch onnx-int8 --mensagens 200
+"""
+import argparse
+import json
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+MODELO = "all-MiniLM-L6-v2"
+
+
+def medir_backend(backend: str, csv: str, mensagens: int) -> dict:
+    """Roda dentro do subprocesso: carrega o encoder e mede tudo."""
+    import numpy as np
+    import pandas as pd
+    from Classes import codificador
+
+    rss_inicial = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    inicio = time.perf_counter()
+    modelo, _ = codificador.carregar(MODELO, backend)
+    segundos_carga = time.perf_counter() - inicio
+
+    df = pd.read_csv(csv)
+    perguntas = df["pergunta"].tolist()
+    embeddings = modelo.encode(perguntas, convert_to_numpy=True, normalize_embeddings=True)
+
+    # Uma mensagem por vez, como chegam pelo websocket
+    tempos = []
+    for pergunta in perguntas[:mensagens]:
+        t = time.perf_counter()
+        modelo.encode(pergunta, convert_to_numpy=True, normalize_embeddings=True)
+        tempos.append((time.perf_counter() - t) * 1000)
+
+    similaridades = embeddings @ embeddings.T
+    np.fill_diagonal(similaridades, -np.inf)
+    previstas = df["intent"].to_numpy()[similaridades.argmax(axis=1)]
+    return {
+        "backend": backend,
+        "carga_s": round(segundos_carga, 2),
+        "ms_mediana": round(statistics.median(tempos), 2),
+        "ms_p95": round(sorted(tempos)[int(len(tempos) * 0.95) - 1], 2),
+        # ru_maxrss vem em KB no Linux
+        "memoria_mb": round((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_inicial) / 1024, 1),
+        "acerto": round(float((previstas == df["intent"].to_numpy()).mean()) * 100, 1),
+        "previstas": previstas.tolist(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--csv", default="../csv/perguntas.csv")
+    parser.add_argument("--mensagens", type=int, default=100)
+    parser.add_argument("--_filho", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args._filho:
+        print(json.dumps(medir_backend(args._filho, args.csv, args.mensagens)))
+        return
+
+    resultados = []
+    for backend in args.backends:
+        comando = [sys.executable, "-m", "benchmarks.comparar_encoders", "--_filho", backend,
+                   "--csv", args.csv, "--mensagens", str(args.mensagens)]
+        saida = subprocess.run(comando, capture_output=True, text=True)
+        if saida.returncode != 0:
+            print(f"{backend}: falhou ({saida.stderr.strip().splitlines()[-1] if saida.stderr.strip() else '?'})")
+            continue
+        resultados.append(json.loads(saida.stdout.strip().splitlines()[-1]))
+
+    referencia = next((r["previstas"] for r in resultados if r["backend"] == "torch"), None)
+    print(f"{'backend':<10} {'carga':>7} {'mediana':>9} {'p95':>9} {'memória':>9} {'acerto':>7} {'concorda':>9}")
+    for r in resultados:
+        concorda = "-"
+        if referencia is not None:
+            iguais = sum(a == b for a, b in zip(r["previstas"], referencia))
+            concorda = f"{iguais / len(referencia) * 100:.1f}%"
+        print(f"{r['backend']:<10} {r['carga_s']:>6.2f}s {r['ms_mediana']:>7.2f}ms {r['ms_p95']:>7.2f}ms "
+              f"{r['memoria_mb']:>6.1f} MB {r['acerto']:>6.1f}% {concorda:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Tempos de EXPLAIN ANALYZE das consultas de relatórios, dashboards e dos
+filtros ILIKE do chatbot, antes e depois das migrações pendentes.
+
+Uso (dentro de src/):
+    python -m benchmarks.explain_consultas                      # só mede o estado atual
+    python -m benchmarks.explain_consultas --migrar             # mede, aplica as pendentes, mede de novo
+    python -m benchmarks.explain_consultas --migrar --opcional particionar_vendas
+"""
+import argparse
+import statistics
+from db import get_connection
+from gerar_relatorios import CONSULTAS_RELATORIO
+from crud_dashboards import SQL_TOP_PRODUTOS, SQL_VENDAS_MENSAIS, SQL_ESTOQUE_POR_CLIENTE
+from migrar import aplicar_pendentes
+
+# Mesmo formato das consultas montadas em execute_query_from_components
+CONSULTAS_CHATBOT = {
+    "chatbot_faturamento_cidade": (
+        "SELECT SUM(zs_peso_liquido) FROM domrock.vendas WHERE zs_cidade ILIKE %s", ("Curitiba",)
+    ),
+    "chatbot_faturamento_produto": (
+        "SELECT SUM(zs_peso_liquido) FROM domrock.vendas WHERE produto ILIKE %s", ("Produto_1",)
+    ),
+    "chatbot_top_cidades_sku": (
+        "SELECT zs_cidade, SUM(zs_peso_liquido) as total FROM domrock.vendas WHERE sku ILIKE %s "
+        "GROUP BY zs_cidade ORDER BY total DESC LIMIT %s", ("SKU_1", 5)
+    ),
+}
+
+
+def consultas() -> dict:
+    todas = {f"relatorio_{nome}": (sql, ()) for nome, sql in CONSULTAS_RELATORIO.items()}
+    todas.update({
+        "dash_top_produtos": (SQL_TOP_PRODUTOS, (5,)),
+        "dash_vendas_mensais": (SQL_VENDAS_MENSAIS, ()),
+        "dash_estoque_por_cliente": (SQL_ESTOQUE_POR_CLIENTE, ()),
+    })
+    todas.update(CONSULTAS_CHATBOT)
+    return todas
+
+
+def medir(repeticoes: int) -> dict:
+    """Mediana do 'Execution Time' (ms) de cada consulta."""
+    tempos = {}
+    with get_connection() as connection, connection.cursor() as cursor:
+        cursor.execute("SET LOCAL statement_timeout = 0")
+        for nome, (sql, params) in consultas().items():
+            sql = sql.strip().rstrip(";")
+            execucoes = []
+            for _ in range(repeticoes):
+                cursor.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}", params)
+                execucoes.append(cursor.fetchone()[0][0]["Execution Time"])
+            tempos[nome] = statistics.median(execucoes)
+    return tempos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--migrar", action="store_true", help="aplica as migrações pendentes entre as medições")
+    parser.add_argument("--opcional", action="append", default=[], metavar="NOME",
+                        help="migração opcional para aplicar junto (com --migrar)")
+    args = parser.parse_args()
+
+    antes = medir(args.repeticoes)
+    if not args.migrar:
+        for nome, ms in antes.items():
+            print(f"{nome:<45} {ms:>10.2f} ms")
+        return
+
+    aplicadas = aplicar_pendentes(args.opcional)
+    if not aplicadas:
+        print("Nenhuma migração pendente: as duas medições seriam iguais.")
+    depois = medir(args.repeticoes)
+
+    print(f"{'consulta':<45} {'antes (ms)':>11} {'depois (ms)':>12} {'ganho':>7}")
+    for nome in antes:
+        ganho = antes[nome] / depois[nome] if depois[nome] else float("inf")
+        print(f"{nome:<45} {antes[nome]:>11.2f} {depois[nome]:>12.2f} {ganho:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Perfil do cold start da API: quanto tempo leva o `import main` (o que o
+uvicorn faz antes de aceitar conexões) e quais imports pesam mais, via
+`python -X importtime`. Com --chatbot, mede também a carga completa do
+chatbot, que antes acontecia dentro do import e agora roda em segundo plano.
+
+Uso (dentro de src/):
+    python -m benchmarks.perfil_importacao
+    python -m benchmarks.perfil_importacao --top 20 --chatbot
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+CARREGAR_CHATBOT = "import json, Classes.Chatbot as c; c._carregar(); print(json.dumps(c.estado()))"
+
+
+def medir(codigo: str, importtime: bool = False):
+    """Roda o código num interpretador novo; retorna (segundos, stdout, stderr)."""
+    comando = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", codigo]
+    inicio = time.perf_counter()
+    resultado = subprocess.run(comando, capture_output=True, text=True)
+    segundos = time.perf_counter() - inicio
+    if resultado.returncode != 0:
+        raise RuntimeError(resultado.stderr.strip().splitlines()[-1] if resultado.stderr.strip() else "falhou")
+    return segundos, resultado.stdout, resultado.stderr
+
+
+def imports_mais_lentos(stderr: str, top: int) -> list:
+    """(ms acumulados, módulo) dos imports feitos direto pelo main, do mais lento ao mais rápido."""
+    linhas = []
+    for linha in stderr.splitlines():
+        if not linha.startswith("import time:") or "cumulative" in linha:
+            continue
+        _, acumulado, modulo = linha[len("import time:"):].split("|")
+        nivel = (len(modulo) - len(modulo.lstrip()) - 1) // 2  # dois espaços por nível
+        if nivel == 1:
+            linhas.append((int(acumulado) / 1000, modulo.strip()))
+    return sorted(linhas, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--chatbot", action="store_true", help="mede também a carga completa do chatbot")
+    args = parser.parse_args()
+
+    segundos, _, _ = medir("import main")
+    _, _, perfil = medir("import main", importtime=True)
+    print(f"import main: {segundos:.2f}s (tempo até a API poder subir)")
+    for ms, modulo in imports_mais_lentos(perfil, args.top):
+        print(f"  {ms:>9.1f} ms  {modulo}")
+
+    if args.chatbot:
+        try:
+            segundos_chatbot, saida, _ = medir(CARREGAR_CHATBOT)
+        except RuntimeError as e:
+            print(f"Carga do chatbot falhou: {e}")
+            return
+        estado = json.loads(saida.strip().splitlines()[-1])
+        if estado["status"] != "pronto":
+            print(f"Carga do chatbot falhou: {estado['erro']}")
+            return
+        print(f"carga completa do chatbot: {segundos_chatbot:.2f}s "
+              f"(antes somada ao import main; agora em segundo plano)")
+
+
+if __name__ == "__main__":
+    main()
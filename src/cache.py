@@ -0,0 +1,322 @@
+"""
+Cache dos resultados agregados (dashboards e consultas do chatbot).
+
+- Backend em memória (LRU com TTL) por padrão; com CACHE_REDIS_URL no .env e o
+  pacote redis instalado, o cache passa a ser compartilhado entre processos.
+- A chave inclui a versão dos dados (domrock.versao_dados), que a importação
+  incrementa na mesma transação da carga: depois de um import, as chaves antigas
+  simplesmente deixam de ser usadas e saem pelo LRU/TTL.
+- Chamadas simultâneas com a mesma chave executam a consulta uma vez só
+  (as outras esperam o resultado), tanto em código síncrono quanto async.
+"""
+import asyncio
+import functools
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from db import get_connection, get_async_connection
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+CACHE_CONFIG = {
+    "ttl_segundos": float(os.getenv("CACHE_TTL_SEGUNDOS", "600")),
+    "max_itens": int(os.getenv("CACHE_MAX_ITENS", "1024")),
+    "redis_url": os.getenv("CACHE_REDIS_URL"),
+    # por quanto tempo a versão lida do banco vale antes de ser consultada de novo
+    "versao_segundos": float(os.getenv("CACHE_VERSAO_SEGUNDOS", "2")),
+}
+
+_AUSENTE = object()
+
+
+class CacheMemoria:
+    """LRU com TTL, local ao processo."""
+    def __init__(self, max_itens: int):
+        self.max_itens = max_itens
+        self._itens = OrderedDict()  # chave -> (expira_em, valor)
+        self._lock = threading.Lock()
+
+    def get(self, chave, padrao=_AUSENTE):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return padrao
+            expira_em, valor = item
+            if expira_em < time.monotonic():
+                del self._itens[chave]
+                return padrao
+            self._itens.move_to_end(chave)
+            return valor
+
+    def set(self, chave, valor, ttl: float):
+        with self._lock:
+            self._itens[chave] = (time.monotonic() + ttl, valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def __len__(self):
+        return len(self._itens)
+
+
+class CacheRedis:
+    """Mesma interface do CacheMemoria, guardando os valores (pickle) no Redis."""
+    PREFIXO = "domrock:cache:"
+
+    def __init__(self, url: str):
+        self._cliente = redis.Redis.from_url(url)
+
+    def get(self, chave, padrao=_AUSENTE):
+        dados = self._cliente.get(self.PREFIXO + chave)
+        return padrao if dados is None else pickle.loads(dados)
+
+    def set(self, chave, valor, ttl: float):
+        self._cliente.set(self.PREFIXO + chave, pickle.dumps(valor), px=int(ttl * 1000))
+
+    def limpar(self):
+        for chave in self._cliente.scan_iter(self.PREFIXO + "*"):
+            self._cliente.delete(chave)
+
+    def __len__(self):
+        return sum(1 for _ in self._cliente.scan_iter(self.PREFIXO + "*"))
+
+
+def _criar_backend():
+    url = CACHE_CONFIG["redis_url"]
+    if url:
+        if redis is not None:
+            return CacheRedis(url)
+        print("CACHE_REDIS_URL definido, mas o pacote redis não está instalado: usando cache em memória")
+    return CacheMemoria(CACHE_CONFIG["max_itens"])
+
+
+_backend = _criar_backend()
+_stats = {"acertos": 0, "faltas": 0, "coalescidas": 0, "erros_backend": 0}
+_stats_lock = threading.Lock()
+
+# Falhas do backend (ex.: Redis fora do ar) viram falta no cache, não erro na consulta
+_ERROS_BACKEND = (redis.RedisError,) if redis is not None else ()
+_FALHA = object()
+
+
+def _contar(chave: str):
+    with _stats_lock:
+        _stats[chave] += 1
+
+
+def _ler(chave: str):
+    """Valor guardado, _AUSENTE se não há, ou _FALHA se o backend não respondeu."""
+    try:
+        return _backend.get(chave)
+    except _ERROS_BACKEND as e:
+        _contar("erros_backend")
+        print(f"Cache indisponível, consultando direto: {e}")
+        return _FALHA
+
+
+def _gravar(chave: str, valor, ttl: float):
+    try:
+        _backend.set(chave, valor, ttl)
+    except _ERROS_BACKEND as e:
+        _contar("erros_backend")
+        print(f"Cache indisponível, resultado não guardado: {e}")
+
+
+# O cliente Redis é síncrono: no caminho async cada ida à rede roda num
+# thread, para não travar o event loop. O backend em memória é chamado direto.
+async def _ler_async(chave: str):
+    if isinstance(_backend, CacheRedis):
+        return await asyncio.to_thread(_ler, chave)
+    return _ler(chave)
+
+
+async def _gravar_async(chave: str, valor, ttl: float):
+    if isinstance(_backend, CacheRedis):
+        await asyncio.to_thread(_gravar, chave, valor, ttl)
+    else:
+        _gravar(chave, valor, ttl)
+
+
+# =====================
+# Versão dos dados
+# =====================
+
+_versao = {"valor": None, "lida_em": 0.0}
+
+SQL_VERSAO = "SELECT versao FROM domrock.versao_dados"
+
+
+def marcar_dados_alterados(cursor):
+    """Incrementa a versão dos dados; chamada dentro da transação que alterou as tabelas."""
+    cursor.execute("UPDATE domrock.versao_dados SET versao = versao + 1, atualizado_em = NOW()")
+
+
+def expirar_versao():
+    """Faz a próxima leitura ir ao banco (usado quando este processo sabe que houve importação)."""
+    _versao["lida_em"] = 0.0
+
+
+def _versao_valida() -> bool:
+    return _versao["valor"] is not None and time.monotonic() - _versao["lida_em"] < CACHE_CONFIG["versao_segundos"]
+
+
+def versao_dados() -> int:
+    if not _versao_valida():
+        with get_connection() as connection, connection.cursor() as cursor:
+            cursor.execute(SQL_VERSAO)
+            _versao.update(valor=cursor.fetchone()[0], lida_em=time.monotonic())
+    return _versao["valor"]
+
+
+async def versao_dados_async() -> int:
+    if not _versao_valida():
+        async with get_async_connection() as connection:
+            valor = await connection.fetchval(SQL_VERSAO)
+        _versao.update(valor=valor, lida_em=time.monotonic())
+    return _versao["valor"]
+
+
+# =====================
+# Single-flight
+# =====================
+
+class _Voo:
+    def __init__(self):
+        self.pronto = threading.Event()
+        self.valor = None
+        self.erro = None
+
+
+_voos = {}
+_voos_lock = threading.Lock()
+_voos_async = {}  # (id do event loop, chave) -> Task
+
+
+def _calcular_e_guardar(chave: str, calcular, ttl: float):
+    valor = _ler(chave)
+    if valor is _AUSENTE or valor is _FALHA:
+        _contar("faltas")
+        guardar = valor is _AUSENTE  # com o backend fora do ar nem tenta gravar
+        valor = calcular()
+        if guardar:
+            _gravar(chave, valor, ttl)
+    return valor
+
+
+def obter(chave: str, calcular, ttl: float = None):
+    valor = _ler(chave)
+    if valor is _FALHA:
+        _contar("faltas")
+        return calcular()
+    if valor is not _AUSENTE:
+        _contar("acertos")
+        return valor
+
+    with _voos_lock:
+        voo = _voos.get(chave)
+        lider = voo is None
+        if lider:
+            voo = _voos[chave] = _Voo()
+
+    if not lider:
+        _contar("coalescidas")
+        voo.pronto.wait()
+        if voo.erro is not None:
+            raise voo.erro
+        return voo.valor
+
+    try:
+        voo.valor = _calcular_e_guardar(chave, calcular, ttl or CACHE_CONFIG["ttl_segundos"])
+        return voo.valor
+    except Exception as e:
+        voo.erro = e
+        raise
+    finally:
+        with _voos_lock:
+            del _voos[chave]
+        voo.pronto.set()
+
+
+async def obter_async(chave: str, calcular, ttl: float = None):
+    """calcular é uma função sem argumentos que retorna uma corrotina."""
+    valor = await _ler_async(chave)
+    if valor is _FALHA:
+        _contar("faltas")
+        return await calcular()
+    if valor is not _AUSENTE:
+        _contar("acertos")
+        return valor
+
+    id_voo = (id(asyncio.get_running_loop()), chave)
+    tarefa = _voos_async.get(id_voo)
+    if tarefa is None:
+        async def calcular_e_guardar():
+            valor = await _ler_async(chave)
+            if valor is _AUSENTE or valor is _FALHA:
+                _contar("faltas")
+                guardar = valor is _AUSENTE
+                valor = await calcular()
+                if guardar:
+                    await _gravar_async(chave, valor, ttl or CACHE_CONFIG["ttl_segundos"])
+            return valor
+
+        tarefa = asyncio.ensure_future(calcular_e_guardar())
+        _voos_async[id_voo] = tarefa
+        tarefa.add_done_callback(lambda _: _voos_async.pop(id_voo, None))
+    else:
+        _contar("coalescidas")
+    # shield: se quem pediu primeiro desistir (cliente desconectou), os outros continuam esperando
+    return await asyncio.shield(tarefa)
+
+
+def _montar_chave(nome: str, versao: int, args, kwargs) -> str:
+    return f"{nome}:v{versao}:{args!r}:{sorted(kwargs.items())!r}"
+
+
+def cacheado(nome: str, ttl: float = None):
+    """
+    Decorator para funções de consulta (síncronas ou async). O resultado é
+    guardado por argumentos + versão dos dados.
+    """
+    def decorador(funcao):
+        if asyncio.iscoroutinefunction(funcao):
+            @functools.wraps(funcao)
+            async def envoltorio_async(*args, **kwargs):
+                chave = _montar_chave(nome, await versao_dados_async(), args, kwargs)
+                return await obter_async(chave, lambda: funcao(*args, **kwargs), ttl)
+            return envoltorio_async
+
+        @functools.wraps(funcao)
+        def envoltorio(*args, **kwargs):
+            chave = _montar_chave(nome, versao_dados(), args, kwargs)
+            return obter(chave, lambda: funcao(*args, **kwargs), ttl)
+        return envoltorio
+    return decorador
+
+
+def limpar():
+    _backend.limpar()
+    expirar_versao()
+
+
+def estatisticas() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    consultas = stats["acertos"] + stats["faltas"] + stats["coalescidas"]
+    stats["taxa_acerto"] = round((stats["acertos"] + stats["coalescidas"]) / consultas, 3) if consultas else 0.0
+    stats["backend"] = type(_backend).__name__
+    try:
+        stats["itens"] = len(_backend)
+    except _ERROS_BACKEND:
+        stats["itens"] = None
+    stats["versao_dados"] = _versao["valor"]
+    return stats
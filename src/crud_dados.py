@@ -1,8 +1,12 @@
-from db import get_connection
+import base64
+import binascii
+from db import get_connection, get_async_connection
 import unidecode
 from BaseModel.Dados import Venda, Estoque
 from Classes.Intencao import Intencao
 from Classes.logger import log_info, log_error
+from cache import cacheado
+import analitico
 
 QUERY_CONFIG = {
     Intencao.TOTAL_ITENS_ESTOQUE:      {"table": "estoque", "agg_func": "SUM",   "agg_column": "es_totalestoque", "desc": "itens em estoque", "format": "float"},
@@ -24,6 +28,21 @@ def format_value(value, fmt_type):
     elif fmt_type == "currency": return f"R$ {value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
     return f"{value:,.2f}"
 
+@cacheado("chatbot_consulta")
+def _buscar(query: str, params: tuple) -> list:
+    """Executa a consulta agregada do chatbot; perguntas repetidas saem do cache."""
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(query, params)
+            return cursor.fetchall()
+
+def _consultar(config: dict, filters: list, n_top: int, query: str, params: list) -> list:
+    """Motor analítico em memória quando o snapshot está em dia; senão, o SQL."""
+    results = analitico.agregar(config, filters, n_top)
+    if results is None:
+        results = _buscar(query, tuple(params))
+    return results
+
 def execute_query_from_components(components: dict) -> list:
     intent = components.get("intent")
     
@@ -63,81 +82,116 @@ def execute_query_from_components(components: dict) -> list:
     query, params, descriptions = build_query(filters)
 
     try:
-        with get_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(query, tuple(params))
-                results = cursor.fetchall()
-
-                # 2. Lógica de Retentativa (Se falhar por causa de acentos)
-                # Se não achou nada e tem filtros de texto, tenta tirar os acentos do valor de busca
-                if (not results or results[0][0] is None) and filters:
-                    new_filters = []
-                    changed = False
-                    for f in filters:
-                        val = str(f['value'])
-                        if not val.isnumeric():
-                            # Remove acentos: São Paulo -> Sao Paulo
-                            no_acc_val = unidecode.unidecode(val)
-                            if no_acc_val != val:
-                                new_filters.append({**f, 'value': no_acc_val})
-                                changed = True
-                                continue
-                        new_filters.append(f)
-                    
-                    if changed:
-                        log_info("Retentando query sem acentos...")
-                        query_retry, params_retry, _ = build_query(new_filters)
-                        cursor.execute(query_retry, tuple(params_retry))
-                        results = cursor.fetchall()
-
-                # Se ainda assim falhar
-                if not results or (len(results) == 1 and results[0][0] is None):
-                    return [f"Não encontrei dados para {' '.join(descriptions)}. (Verifique a grafia)"]
-
-                fmt_type = config.get("format", "float")
-                
-                # === RESPOSTA LISTA ===
-                if "group_by" in config:
-                    qtd = len(results)
-                    # Correção Gramatical Plural
-                    txt_item = "item" if qtd == 1 else "itens"
-                    desc = config.get('desc')
-                    
-                    if qtd < n_top:
-                        header = f"Desculpa, você pediu {n_top}, mas só encontrei {qtd} {desc}:"
-                    else:
-                        header = f"Aqui estão os top {qtd} {desc}:"
-                    
-                    lines = [header] + [f"- {item}: {format_value(total, fmt_type)}" for item, total in results]
-                    return lines
-                
-                # === RESPOSTA ÚNICA ===
-                else:
-                    val = results[0][0] or 0
-                    desc = config.get("desc")
-                    
-                    # Correção: Só adiciona "para [filtros]" se houver filtros
-                    if descriptions:
-                         msg_final = f"O {desc} para {' '.join(descriptions)} é {format_value(val, fmt_type)}."
-                    else:
-                         msg_final = f"O {desc} é {format_value(val, fmt_type)}."
-                         
-                    return [msg_final]
+        results = _consultar(config, filters, n_top, query, params)
+
+        # 2. Lógica de Retentativa (Se falhar por causa de acentos)
+        # Se não achou nada e tem filtros de texto, tenta tirar os acentos do valor de busca
+        if (not results or results[0][0] is None) and filters:
+            new_filters = []
+            changed = False
+            for f in filters:
+                val = str(f['value'])
+                if not val.isnumeric():
+                    # Remove acentos: São Paulo -> Sao Paulo
+                    no_acc_val = unidecode.unidecode(val)
+                    if no_acc_val != val:
+                        new_filters.append({**f, 'value': no_acc_val})
+                        changed = True
+                        continue
+                new_filters.append(f)
+            
+            if changed:
+                log_info("Retentando query sem acentos...")
+                query_retry, params_retry, _ = build_query(new_filters)
+                results = _consultar(config, new_filters, n_top, query_retry, params_retry)
+
+        # Se ainda assim falhar
+        if not results or (len(results) == 1 and results[0][0] is None):
+            return [f"Não encontrei dados para {' '.join(descriptions)}. (Verifique a grafia)"]
+
+        fmt_type = config.get("format", "float")
+        
+        # === RESPOSTA LISTA ===
+        if "group_by" in config:
+            qtd = len(results)
+            # Correção Gramatical Plural
+            txt_item = "item" if qtd == 1 else "itens"
+            desc = config.get('desc')
+            
+            if qtd < n_top:
+                header = f"Desculpa, você pediu {n_top}, mas só encontrei {qtd} {desc}:"
+            else:
+                header = f"Aqui estão os top {qtd} {desc}:"
+            
+            lines = [header] + [f"- {item}: {format_value(total, fmt_type)}" for item, total in results]
+            return lines
+        
+        # === RESPOSTA ÚNICA ===
+        else:
+            val = results[0][0] or 0
+            desc = config.get("desc")
+            
+            # Correção: Só adiciona "para [filtros]" se houver filtros
+            if descriptions:
+                 msg_final = f"O {desc} para {' '.join(descriptions)} é {format_value(val, fmt_type)}."
+            else:
+                 msg_final = f"O {desc} é {format_value(val, fmt_type)}."
+                 
+            return [msg_final]
 
     except Exception as e:
         log_error(f"Erro SQL: {e}")
         return ["Erro técnico no banco de dados."]
 
-def get_vendas(skip: int = 0, limit: int = 10):
-    with get_connection() as connection:
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT * FROM domrock.vendas ORDER BY id_venda OFFSET %s LIMIT %s", (skip, limit))
-            rows, columns = cursor.fetchall(), [desc[0] for desc in cursor.description]
-            return [Venda(**dict(zip(columns, row))) for row in rows]
-
-def get_estoque(skip: int = 0, limit: int = 10):
-    with get_connection() as connection:
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT * FROM domrock.estoque ORDER BY id_estoque OFFSET %s LIMIT %s", (skip, limit))
-            rows, columns = cursor.fetchall(), [desc[0] for desc in cursor.description]
-            return [Estoque(**dict(zip(columns, row))) for row in rows]
+# Paginação por chave (keyset): o cursor guarda o último id entregue e a
+# próxima página começa depois dele pelo índice da chave primária, sem o custo
+# crescente do OFFSET. O valor é opaco para o cliente.
+def codificar_cursor(ultimo_id: int) -> str:
+    return base64.urlsafe_b64encode(f"id:{ultimo_id}".encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str) -> int:
+    try:
+        texto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        prefixo, ultimo_id = texto.split(":")
+        if prefixo != "id":
+            raise ValueError
+        return int(ultimo_id)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise ValueError("Cursor de paginação inválido")
+
+
+def proximo_cursor(linhas: list, limit: int, coluna_id: str):
+    """Cursor da próxima página, ou None quando esta página foi a última."""
+    if len(linhas) < limit:
+        return None
+    ultima = linhas[-1]
+    return codificar_cursor(ultima[coluna_id] if isinstance(ultima, dict) else getattr(ultima, coluna_id))
+
+
+# =====================
+# Leitura enxuta (dicts prontos para o orjson, sem um modelo pydantic por
+# linha). As colunas são as dos modelos, que continuam documentando a API.
+# =====================
+
+COLUNAS_VENDAS = ", ".join(Venda.model_fields)
+COLUNAS_ESTOQUE = ", ".join(Estoque.model_fields)
+
+
+async def _buscar_pagina(tabela: str, colunas: str, coluna_id: str, skip: int, limit: int, after_id: int = None) -> list:
+    async with get_async_connection() as connection:
+        if after_id is None:
+            rows = await connection.fetch(
+                f"SELECT {colunas} FROM domrock.{tabela} ORDER BY {coluna_id} OFFSET $1 LIMIT $2", skip, limit
+            )
+        else:
+            rows = await connection.fetch(
+                f"SELECT {colunas} FROM domrock.{tabela} WHERE {coluna_id} > $1 ORDER BY {coluna_id} LIMIT $2", after_id, limit
+            )
+        return [dict(row) for row in rows]
+
+async def get_vendas_linhas_async(skip: int = 0, limit: int = 10, after_id: int = None) -> list:
+    return await _buscar_pagina("vendas", COLUNAS_VENDAS, "id_venda", skip, limit, after_id)
+
+async def get_estoque_linhas_async(skip: int = 0, limit: int = 10, after_id: int = None) -> list:
+    return await _buscar_pagina("estoque", COLUNAS_ESTOQUE, "id_estoque", skip, limit, after_id)
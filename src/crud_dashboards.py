@@ -1,19 +1,40 @@
-from db import get_connection
+from db import get_connection, get_async_connection
+from cache import cacheado
+
+# Consultas dos dashboards (também usadas por benchmarks/explain_consultas.py).
+# Leem os agregados mensais de rollups.py, então o custo depende do número de
+# meses x valores distintos, não do tamanho de vendas/estoque.
+SQL_TOP_PRODUTOS = """
+    SELECT NULLIF(valor, '') AS produto, SUM(total_peso) AS total_vendido
+    FROM domrock.rollup_vendas_mensal
+    WHERE dimensao = 'produto'
+    GROUP BY valor
+    ORDER BY total_vendido DESC
+    LIMIT %s
+"""
+
+SQL_VENDAS_MENSAIS = """
+    SELECT DATE_TRUNC('month', mes) AS mes,
+           total_peso AS total_vendido
+    FROM domrock.rollup_vendas_mensal
+    WHERE dimensao = 'total'
+    ORDER BY mes
+"""
+
+SQL_ESTOQUE_POR_CLIENTE = """
+    SELECT NULLIF(valor, '') AS cod_cliente, SUM(total_estoque) AS total_estoque
+    FROM domrock.rollup_estoque_mensal
+    WHERE dimensao = 'cod_cliente'
+    GROUP BY valor
+    ORDER BY total_estoque DESC
+"""
 
 # 📌 1. Top produtos mais vendidos
+@cacheado("get_top_produtos")
 def get_top_produtos(limit: int = 5):
     with get_connection() as connection:
         with connection.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT produto, SUM(zs_peso_liquido) AS total_vendido
-                FROM domrock.vendas
-                GROUP BY produto
-                ORDER BY total_vendido DESC
-                LIMIT %s
-                """,
-                (limit,)
-            )
+            cursor.execute(SQL_TOP_PRODUTOS, (limit,))
             rows = cursor.fetchall()
             return [
                 {"produto": r[0], "total_vendido": float(r[1]) if r[1] else 0}
@@ -22,18 +43,11 @@ def get_top_produtos(limit: int = 5):
 
 
 # 📌 2. Vendas mensais (para linha do tempo)
+@cacheado("get_vendas_mensais")
 def get_vendas_mensais():
     with get_connection() as connection:
         with connection.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT DATE_TRUNC('month', data) AS mes,
-                       SUM(zs_peso_liquido) AS total_vendido
-                FROM domrock.vendas
-                GROUP BY mes
-                ORDER BY mes
-                """
-            )
+            cursor.execute(SQL_VENDAS_MENSAIS)
             rows = cursor.fetchall()
             return [
                 {"mes": r[0], "total_vendido": float(r[1]) if r[1] else 0}
@@ -42,19 +56,47 @@ def get_vendas_mensais():
 
 
 # 📌 3. Estoque por cliente
+@cacheado("get_estoque_por_cliente")
 def get_estoque_por_cliente():
     with get_connection() as connection:
         with connection.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT cod_cliente, SUM(es_totalestoque) AS total_estoque
-                FROM domrock.estoque
-                GROUP BY cod_cliente
-                ORDER BY total_estoque DESC
-                """
-            )
+            cursor.execute(SQL_ESTOQUE_POR_CLIENTE)
             rows = cursor.fetchall()
             return [
                 {"cliente": r[0], "total_estoque": float(r[1]) if r[1] else 0}
                 for r in rows
             ]
+
+
+# =====================
+# Versões assíncronas (usadas pelos endpoints async)
+# =====================
+
+@cacheado("get_top_produtos")
+async def get_top_produtos_async(limit: int = 5):
+    async with get_async_connection() as connection:
+        rows = await connection.fetch(SQL_TOP_PRODUTOS.replace("%s", "$1"), limit)
+        return [
+            {"produto": r[0], "total_vendido": float(r[1]) if r[1] else 0}
+            for r in rows
+        ]
+
+
+@cacheado("get_vendas_mensais")
+async def get_vendas_mensais_async():
+    async with get_async_connection() as connection:
+        rows = await connection.fetch(SQL_VENDAS_MENSAIS)
+        return [
+            {"mes": r[0], "total_vendido": float(r[1]) if r[1] else 0}
+            for r in rows
+        ]
+
+
+@cacheado("get_estoque_por_cliente")
+async def get_estoque_por_cliente_async():
+    async with get_async_connection() as connection:
+        rows = await connection.fetch(SQL_ESTOQUE_POR_CLIENTE)
+        return [
+            {"cliente": r[0], "total_estoque": float(r[1]) if r[1] else 0}
+            for r in rows
+        ]
@@ -1,4 +1,5 @@
-from db import get_connection
+import asyncio
+from db import get_connection, get_async_connection
 from BaseModel.Usuario import Usuario, UpdateUsuario, CreateUsuario
 from auth.auth import hash_senha
 
@@ -72,3 +73,54 @@ def delete_usuario(id: int):
         with connection.cursor() as cursor:
             cursor.execute("DELETE FROM domrock.usuario WHERE id = %s", (id,))
             connection.commit()
+
+
+#-----------------Versões assíncronas-----------------#
+
+async def create_usuario_async(usuario: CreateUsuario):
+    senha_hash = await asyncio.to_thread(hash_senha, usuario.senha) #argon2 é pesado, roda fora do event loop
+    async with get_async_connection() as connection:
+        new_user = await connection.fetchrow(
+            "INSERT INTO domrock.usuario (nome, email, senha) VALUES ($1, $2, $3) RETURNING id, nome, email, senha",
+            usuario.nome, usuario.email, senha_hash
+        )
+        return Usuario(id=new_user[0], nome=new_user[1], email=new_user[2])
+
+async def read_usuario_byid_async(id: int):
+    async with get_async_connection() as connection:
+        user = await connection.fetchrow("SELECT id, nome, email, senha FROM domrock.usuario WHERE id = $1", id)
+        if user:
+            return Usuario(id=user[0], nome=user[1], email=user[2])
+        return None
+
+async def read_usuario_byemail_async(email: str):
+    async with get_async_connection() as connection:
+        user = await connection.fetchrow("SELECT id, nome, email, senha FROM domrock.usuario WHERE email = $1", email)
+        if user:
+            return Usuario(id=user[0], nome=user[1], email=user[2], senha=user[3])
+        return None
+
+async def update_usuario_async(id: int, usuario: UpdateUsuario):
+    async with get_async_connection() as connection:
+        async with connection.transaction():
+            current_user = await connection.fetchrow(
+                "SELECT nome, email, senha FROM domrock.usuario WHERE id = $1 FOR UPDATE", id
+            )
+            if not current_user:
+                return None
+
+            updated_user = {
+                "nome": usuario.nome if usuario.nome is not None else current_user[0],
+                "email": usuario.email if usuario.email is not None else current_user[1],
+                "senha": usuario.senha if usuario.senha is not None else current_user[2],
+            }
+
+            updated_user_data = await connection.fetchrow(
+                "UPDATE domrock.usuario SET nome = $1, email = $2, senha = $3 WHERE id = $4 RETURNING id, nome, email, senha",
+                updated_user["nome"], updated_user["email"], updated_user["senha"], id,
+            )
+            return Usuario(id=updated_user_data[0], nome=updated_user_data[1], email=updated_user_data[2])
+
+async def delete_usuario_async(id: int):
+    async with get_async_connection() as connection:
+        await connection.execute("DELETE FROM domrock.usuario WHERE id = $1", id)
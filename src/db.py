@@ -1,5 +1,11 @@
 import psycopg2
+import asyncpg
+import asyncio
 import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -12,10 +18,267 @@ DB_CONFIG = {
     "password": os.getenv("DB_PASSWORD")
 }
 
+# Configuração do pool (todas opcionais no .env)
+POOL_CONFIG = {
+    "min_conexoes": int(os.getenv("DB_POOL_MIN", "1")),
+    "max_conexoes": int(os.getenv("DB_POOL_MAX", "10")),
+    "timeout_aquisicao": float(os.getenv("DB_POOL_TIMEOUT", "10")),  # segundos esperando uma conexão livre
+    "statement_timeout_ms": int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000")),  # 0 desliga
+    "checagem_ociosa": float(os.getenv("DB_POOL_CHECAGEM_SEGUNDOS", "30")),  # testa conexões paradas há mais tempo que isso
+}
+
+
+class PoolEsgotado(Exception):
+    """Nenhuma conexão ficou livre dentro do timeout de aquisição."""
+
+
+class PoolConexoes:
+    """
+    Pool de conexões psycopg2 com limite mínimo/máximo, timeout de aquisição,
+    checagem de saúde das conexões e estatísticas de uso.
+
+    As conexões devolvidas ficam abertas (até o máximo) para serem reaproveitadas,
+    diferente do psycopg2.pool que fecha tudo acima do mínimo.
+    """
+    def __init__(self, min_conexoes, max_conexoes, timeout_aquisicao, statement_timeout_ms, checagem_ociosa, **db_config):
+        self._db_config = dict(db_config)
+        if statement_timeout_ms:
+            self._db_config["options"] = f"-c statement_timeout={statement_timeout_ms}"
+        self.min_conexoes = min_conexoes
+        self.max_conexoes = max_conexoes
+        self.timeout_aquisicao = timeout_aquisicao
+        self.checagem_ociosa = checagem_ociosa
+
+        self._vagas = threading.BoundedSemaphore(max_conexoes)
+        self._lock = threading.Lock()
+        self._ociosas = deque()  # (conexão, instante em que voltou ao pool)
+        self._stats = {
+            "abertas": 0,
+            "em_uso": 0,
+            "aquisicoes": 0,
+            "conexoes_criadas": 0,
+            "conexoes_descartadas": 0,
+            "timeouts": 0,
+            "espera_total_ms": 0.0,
+        }
+
+        for _ in range(min_conexoes):
+            self._ociosas.append((self._conectar(), time.monotonic()))
+
+    def _conectar(self):
+        conn = psycopg2.connect(**self._db_config)
+        with self._lock:
+            self._stats["abertas"] += 1
+            self._stats["conexoes_criadas"] += 1
+        return conn
+
+    def _descartar(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._lock:
+            self._stats["abertas"] -= 1
+            self._stats["conexoes_descartadas"] += 1
+
+    def _conexao_saudavel(self, conn, parada_desde) -> bool:
+        if conn.closed:
+            return False
+        # Só faz o round-trip se a conexão ficou parada por muito tempo
+        if time.monotonic() - parada_desde < self.checagem_ociosa:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def acquire(self):
+        inicio = time.monotonic()
+        if not self._vagas.acquire(timeout=self.timeout_aquisicao):
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise PoolEsgotado(
+                f"Nenhuma conexão livre após {self.timeout_aquisicao}s (máximo de {self.max_conexoes})"
+            )
+        try:
+            conn = None
+            while conn is None:
+                with self._lock:
+                    ociosa = self._ociosas.pop() if self._ociosas else None
+                if ociosa is None:
+                    conn = self._conectar()
+                elif self._conexao_saudavel(*ociosa):
+                    conn = ociosa[0]
+                else:
+                    self._descartar(ociosa[0])
+        except Exception:
+            self._vagas.release()
+            raise
+
+        with self._lock:
+            self._stats["aquisicoes"] += 1
+            self._stats["em_uso"] += 1
+            self._stats["espera_total_ms"] += (time.monotonic() - inicio) * 1000
+        return conn
+
+    def release(self, conn):
+        saudavel = not conn.closed
+        if saudavel:
+            try:
+                # Nunca devolve uma conexão com transação aberta para o pool
+                conn.rollback()
+            except psycopg2.Error:
+                saudavel = False
+        with self._lock:
+            self._stats["em_uso"] -= 1
+            if saudavel:
+                self._ociosas.append((conn, time.monotonic()))
+        if not saudavel:
+            self._descartar(conn)
+        self._vagas.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["ociosas"] = len(self._ociosas)
+        stats["min_conexoes"] = self.min_conexoes
+        stats["max_conexoes"] = self.max_conexoes
+        stats["espera_media_ms"] = round(stats["espera_total_ms"] / stats["aquisicoes"], 3) if stats["aquisicoes"] else 0.0
+        stats["espera_total_ms"] = round(stats["espera_total_ms"], 3)
+        return stats
+
+    def close(self):
+        with self._lock:
+            ociosas = list(self._ociosas)
+            self._ociosas.clear()
+        for conn, _ in ociosas:
+            self._descartar(conn)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_pid = None
+
+
+def get_pool() -> PoolConexoes:
+    """Cria o pool na primeira chamada (e de novo em processos filhos após fork)."""
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                try:
+                    _pool = PoolConexoes(**POOL_CONFIG, **DB_CONFIG)
+                    _pool_pid = os.getpid()
+                    print(f"Pool de conexões criado ({POOL_CONFIG['min_conexoes']}-{POOL_CONFIG['max_conexoes']})")
+                except Exception as e:
+                    print(f"Erro ao conectar ao banco de dados: {e}")
+                    raise
+    return _pool
+
+
+@contextmanager
 def get_connection():
+    """
+    Empresta uma conexão do pool. Faz commit se o bloco terminar sem erro,
+    rollback se der exceção, e sempre devolve a conexão ao pool.
+    """
+    pool_conexoes = get_pool()
+    conn = pool_conexoes.acquire()
     try:
-        print("Conexão feita")
-        return psycopg2.connect(**DB_CONFIG)
-    except Exception as e:
-        print(f"Erro ao conectar ao banco de dados: {e}")
-        raise
\ No newline at end of file
+        yield conn
+        conn.commit()
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        pool_conexoes.release(conn)
+
+
+def get_pool_stats() -> dict:
+    if _pool is None or _pool_pid != os.getpid():
+        return {"abertas": 0, "em_uso": 0, "ociosas": 0, "aquisicoes": 0}
+    return _pool.stats()
+
+
+def fechar_pool():
+    global _pool
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.close()
+    _pool = None
+
+
+# =====================
+# Pool assíncrono (asyncpg) usado pelos endpoints async do FastAPI
+# =====================
+
+_pool_async = None
+_pool_async_lock = asyncio.Lock()
+
+
+async def get_async_pool() -> asyncpg.Pool:
+    global _pool_async
+    if _pool_async is None:
+        async with _pool_async_lock:
+            if _pool_async is None:
+                statement_timeout = POOL_CONFIG["statement_timeout_ms"]
+                try:
+                    _pool_async = await asyncpg.create_pool(
+                        host=DB_CONFIG["host"],
+                        port=DB_CONFIG["port"],
+                        database=DB_CONFIG["dbname"],
+                        user=DB_CONFIG["user"],
+                        password=DB_CONFIG["password"],
+                        min_size=POOL_CONFIG["min_conexoes"],
+                        max_size=POOL_CONFIG["max_conexoes"],
+                        # conexões ociosas por muito tempo são fechadas e recriadas sob demanda
+                        max_inactive_connection_lifetime=POOL_CONFIG["checagem_ociosa"] * 10,
+                        server_settings={"statement_timeout": str(statement_timeout)} if statement_timeout else None,
+                    )
+                    print(f"Pool assíncrono criado ({POOL_CONFIG['min_conexoes']}-{POOL_CONFIG['max_conexoes']})")
+                except Exception as e:
+                    print(f"Erro ao conectar ao banco de dados: {e}")
+                    raise
+    return _pool_async
+
+
+@asynccontextmanager
+async def get_async_connection():
+    """
+    Versão assíncrona do get_connection. Não abre transação sozinha:
+    quem escreve usa `async with conn.transaction()`.
+    """
+    pool_async = await get_async_pool()
+    try:
+        conn = await pool_async.acquire(timeout=POOL_CONFIG["timeout_aquisicao"])
+    except asyncio.TimeoutError:
+        raise PoolEsgotado(
+            f"Nenhuma conexão livre após {POOL_CONFIG['timeout_aquisicao']}s (máximo de {POOL_CONFIG['max_conexoes']})"
+        )
+    try:
+        yield conn
+    finally:
+        await pool_async.release(conn)
+
+
+def get_async_pool_stats() -> dict:
+    if _pool_async is None:
+        return {"abertas": 0, "em_uso": 0, "ociosas": 0}
+    abertas, ociosas = _pool_async.get_size(), _pool_async.get_idle_size()
+    return {
+        "abertas": abertas,
+        "em_uso": abertas - ociosas,
+        "ociosas": ociosas,
+        "min_conexoes": _pool_async.get_min_size(),
+        "max_conexoes": _pool_async.get_max_size(),
+    }
+
+
+async def fechar_pool_async():
+    global _pool_async
+    if _pool_async is not None:
+        await _pool_async.close()
+    _pool_async = None
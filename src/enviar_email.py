@@ -1,14 +1,11 @@
 import os
-import pandas as pd
-from dotenv import load_dotenv
-import re
-from typing import Dict
+import time
 import smtplib
+from typing import Dict
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
 from email import encoders
-from io import BytesIO
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,9 +13,18 @@ load_dotenv()
 EMAIL_REMETENTE = os.getenv("EMAIL_REMETENTE")
 SENHA_APP = os.getenv("SENHA_APP")
 
+# Servidor SMTP (padrão: Gmail). Para testar local, aponte para um servidor de
+# mentira, ex.: SMTP_HOST=localhost SMTP_PORT=1025 SMTP_STARTTLS=false
+SMTP_CONFIG = {
+    "host": os.getenv("SMTP_HOST", "smtp.gmail.com"),
+    "port": int(os.getenv("SMTP_PORT", "587")),
+    "starttls": os.getenv("SMTP_STARTTLS", "true").lower() == "true",
+    "timeout": float(os.getenv("SMTP_TIMEOUT_SEGUNDOS", "30")),
+    "ociosa": float(os.getenv("SMTP_SESSAO_OCIOSA_SEGUNDOS", "60")),  # testa a sessão parada há mais tempo que isso
+}
 
-def enviar_email(destinatario: str, arquivos: Dict[str, bytes] , assunto: str, corpo: str):
-    
+
+def montar_mensagem(destinatario: str, arquivos: Dict[str, bytes], assunto: str, corpo: str) -> MIMEMultipart:
     msg = MIMEMultipart()
     msg["From"] = EMAIL_REMETENTE
     msg["To"] = destinatario
@@ -31,11 +37,74 @@ def enviar_email(destinatario: str, arquivos: Dict[str, bytes] , assunto: str, c
         encoders.encode_base64(part)
         part.add_header("Content-Disposition", f"attachment; filename={nome_arquivo}.csv")
         msg.attach(part)
+    return msg
+
+
+class SessaoSMTP:
+    """
+    Sessão SMTP reaproveitada entre envios: conecta, faz STARTTLS e login uma
+    vez, e reconecta sozinha se o servidor derrubar a conexão.
+    """
+    def __init__(self, host=None, port=None, starttls=None, timeout=None, ociosa=None):
+        self.host = host or SMTP_CONFIG["host"]
+        self.port = port or SMTP_CONFIG["port"]
+        self.starttls = SMTP_CONFIG["starttls"] if starttls is None else starttls
+        self.timeout = timeout or SMTP_CONFIG["timeout"]
+        self.ociosa = SMTP_CONFIG["ociosa"] if ociosa is None else ociosa
+        self._smtp = None
+        self._usada_em = 0.0
+        self.conexoes = 0
 
-    server = smtplib.SMTP("smtp.gmail.com", 587)
-    server.starttls()
-    server.login(EMAIL_REMETENTE, SENHA_APP)
-    server.sendmail(EMAIL_REMETENTE, destinatario, msg.as_string())
-    server.quit()
+    def _conectar(self):
+        self.fechar()
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                smtp.starttls()
+            if SENHA_APP:
+                smtp.login(EMAIL_REMETENTE, SENHA_APP)
+        except Exception:
+            smtp.close()
+            raise
+        self._smtp = smtp
+        self.conexoes += 1
+
+    def _garantir_conexao(self):
+        if self._smtp is None:
+            self._conectar()
+        elif time.monotonic() - self._usada_em > self.ociosa:
+            # Servidores costumam fechar sessões paradas; NOOP confirma antes de usar
+            try:
+                if self._smtp.noop()[0] != 250:
+                    self._conectar()
+            except (smtplib.SMTPException, OSError):
+                self._conectar()
+
+    def enviar(self, msg: MIMEMultipart, destinatario: str):
+        self._garantir_conexao()
+        try:
+            self._smtp.sendmail(EMAIL_REMETENTE, destinatario, msg.as_string())
+        except smtplib.SMTPServerDisconnected:
+            # Conexão caiu entre um envio e outro: reconecta e tenta uma vez
+            self._conectar()
+            self._smtp.sendmail(EMAIL_REMETENTE, destinatario, msg.as_string())
+        self._usada_em = time.monotonic()
+
+    def fechar(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                self._smtp.close()
+            self._smtp = None
+
+
+def enviar_email(destinatario: str, arquivos: Dict[str, bytes] , assunto: str, corpo: str):
+    """Envio avulso, numa sessão própria. Para vários envios use fila_envios."""
+    sessao = SessaoSMTP()
+    try:
+        sessao.enviar(montar_mensagem(destinatario, arquivos, assunto, corpo), destinatario)
+    finally:
+        sessao.fechar()
 
     print(f"E-mail enviado para {destinatario}")
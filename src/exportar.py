@@ -0,0 +1,233 @@
+"""
+Exportação completa de vendas/estoque em streaming (NDJSON, CSV, Arrow IPC
+ou Parquet).
+
+A consulta roda num cursor nomeado (server-side) do psycopg2: o Postgres
+entrega as linhas em lotes de EXPORTACAO_LOTE e cada lote vira um pedaço da
+resposta, então a memória fica constante no servidor e no cliente, seja qual
+for o tamanho da tabela.
+
+Nos formatos colunares (pacote pyarrow) cada lote vira direto um record batch
+do Arrow, coluna a coluna, sem passar por dicts nem pelos modelos pydantic.
+"""
+import csv
+import io
+import os
+import uuid
+from datetime import date
+from db import get_connection
+from respostas import para_json
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+EXPORTACAO_LOTE = int(os.getenv("EXPORTACAO_LOTE", "5000"))
+# linhas por row group do Parquet (lotes menores deixam o arquivo maior e a leitura mais lenta)
+EXPORTACAO_PARQUET_LINHAS_GRUPO = int(os.getenv("EXPORTACAO_PARQUET_LINHAS_GRUPO", "100000"))
+
+TABELAS = {
+    "vendas": {
+        "id": "id_venda",
+        "colunas": ["id_venda", "data", "cod_cliente", "cod_produto", "lote", "origem", "zs_gr_mercad", "produto",
+                    "zs_centro", "zs_cidade", "zs_uf", "sku", "zs_peso_liquido", "giro_sku_cliente"],
+        "cidade": "zs_cidade",
+        "inteiras": ["id_venda"],
+        "decimais": ["zs_peso_liquido", "giro_sku_cliente"],
+    },
+    "estoque": {
+        "id": "id_estoque",
+        "colunas": ["id_estoque", "data", "cod_cliente", "cod_produto", "es_centro", "tipo_material", "origem", "lote",
+                    "dias_em_estoque", "produto", "grupo_mercadoria", "es_totalestoque", "sku"],
+        "cidade": None,
+        "inteiras": ["id_estoque", "dias_em_estoque"],
+        "decimais": ["es_totalestoque"],
+    },
+}
+
+TIPOS_CONTEUDO = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+FORMATOS_COLUNARES = {"arrow", "parquet"}
+
+
+class ExportacaoIndisponivel(Exception):
+    """Formato colunar pedido sem o pacote pyarrow instalado."""
+
+
+def _tipo_arrow(tabela: dict, coluna: str):
+    if coluna in tabela["inteiras"]:
+        return pa.int64()
+    if coluna in tabela["decimais"]:
+        return pa.float64()
+    if coluna == "data":
+        return pa.date32()
+    return pa.string()
+
+
+def schema_arrow(tipo: str):
+    tabela = TABELAS[tipo]
+    return pa.schema([(coluna, _tipo_arrow(tabela, coluna)) for coluna in tabela["colunas"]])
+
+
+def montar_consulta(tipo: str, data_inicio: date = None, data_fim: date = None,
+                    sku: str = None, cidade: str = None, cliente: str = None, colunar: bool = False):
+    """
+    SELECT com os filtros pedidos (todos opcionais), em ordem de id. Com
+    colunar=True os DECIMAL já saem como float8, evitando criar um Decimal
+    do Python por valor.
+    """
+    tabela = TABELAS[tipo]
+    where, params = [], []
+    if data_inicio is not None:
+        where.append("data >= %s")
+        params.append(data_inicio)
+    if data_fim is not None:
+        where.append("data <= %s")
+        params.append(data_fim)
+    if sku:
+        where.append("sku = %s")
+        params.append(sku)
+    if cidade:
+        if tabela["cidade"] is None:
+            raise ValueError(f"Filtro por cidade não existe para {tipo}")
+        where.append(f"{tabela['cidade']} = %s")
+        params.append(cidade)
+    if cliente:
+        where.append("cod_cliente = %s")
+        params.append(cliente)
+
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+    colunas = [f"{c}::float8 AS {c}" if colunar and c in tabela["decimais"] else c for c in tabela["colunas"]]
+    query = f"SELECT {', '.join(colunas)} FROM domrock.{tipo} {where_sql} ORDER BY {tabela['id']}"
+    return query, params
+
+
+def _lote_ndjson(colunas: list, linhas: list) -> bytes:
+    return b"".join(para_json(dict(zip(colunas, linha))) + b"\n" for linha in linhas)
+
+
+def _lote_csv(linhas: list) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(linhas)
+    return buffer.getvalue().encode("utf-8")
+
+
+def _lotes(query: str, params: list):
+    """Lotes de linhas (tuplas) vindos de um cursor nomeado."""
+    with get_connection() as connection:
+        # Cada FETCH é um comando novo: o statement_timeout do pool vale por lote, não pela exportação
+        with connection.cursor(name=f"exportar_{uuid.uuid4().hex}") as cursor:
+            cursor.itersize = EXPORTACAO_LOTE
+            cursor.execute(query, params)
+            while linhas := cursor.fetchmany(EXPORTACAO_LOTE):
+                yield linhas
+
+
+def _gerar(query: str, params: list, colunas: list, formato: str):
+    if formato == "csv":
+        yield _lote_csv([colunas])
+    for linhas in _lotes(query, params):
+        yield _lote_csv(linhas) if formato == "csv" else _lote_ndjson(colunas, linhas)
+
+
+def _record_batch(schema, linhas: list):
+    colunas = list(zip(*linhas))
+    return pa.record_batch([pa.array(valores, type=campo.type) for valores, campo in zip(colunas, schema)], schema=schema)
+
+
+class _SaidaDrenavel:
+    """Arquivo em memória que o writer do Arrow/Parquet preenche e o gerador esvazia a cada pedaço."""
+    def __init__(self):
+        self._buffer = bytearray()
+        self._posicao = 0
+        self.closed = False
+
+    def write(self, dados) -> int:
+        self._buffer += dados
+        self._posicao += len(dados)
+        return len(dados)
+
+    def tell(self) -> int:
+        return self._posicao
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drenar(self) -> bytes:
+        dados = bytes(self._buffer)
+        self._buffer.clear()
+        return dados
+
+
+def _gerar_arrow(lotes, schema):
+    saida = _SaidaDrenavel()
+    with pa.ipc.new_stream(saida, schema) as writer:
+        for linhas in lotes:
+            writer.write_batch(_record_batch(schema, linhas))
+            yield saida.drenar()
+    yield saida.drenar()
+
+
+def _gerar_parquet(lotes, schema):
+    saida = _SaidaDrenavel()
+    pendentes, linhas_pendentes = [], 0
+    with pq.ParquetWriter(saida, schema, compression="zstd") as writer:
+        for linhas in lotes:
+            pendentes.append(_record_batch(schema, linhas))
+            linhas_pendentes += len(linhas)
+            if linhas_pendentes >= EXPORTACAO_PARQUET_LINHAS_GRUPO:
+                writer.write_table(pa.Table.from_batches(pendentes, schema))
+                pendentes, linhas_pendentes = [], 0
+                yield saida.drenar()
+        if pendentes:
+            writer.write_table(pa.Table.from_batches(pendentes, schema))
+    yield saida.drenar()
+
+
+def _verificar_pyarrow(formato: str):
+    if formato in FORMATOS_COLUNARES and pa is None:
+        raise ExportacaoIndisponivel(f"Exportação em {formato} precisa do pacote pyarrow (pip install pyarrow)")
+
+
+def metricas_para_colunar(metricas: dict, formato: str) -> bytes:
+    """Métricas do relatório (uma linha por métrica) em Arrow IPC ou Parquet."""
+    _verificar_pyarrow(formato)
+    valores = [v.get("valor") if isinstance(v, dict) else None for v in metricas.values()]
+    tabela = pa.table({
+        "metrica": pa.array(list(metricas), pa.string()),
+        "valor": pa.array([float(v) if v is not None else None for v in valores], pa.float64()),
+        "descricao": pa.array([v.get("descricao") if isinstance(v, dict) else str(v) for v in metricas.values()], pa.string()),
+    })
+    saida = pa.BufferOutputStream()
+    if formato == "arrow":
+        with pa.ipc.new_stream(saida, tabela.schema) as writer:
+            writer.write_table(tabela)
+    else:
+        pq.write_table(tabela, saida)
+    return saida.getvalue().to_pybytes()
+
+
+def exportar(tipo: str, formato: str, **filtros):
+    """
+    Valida os filtros e retorna um gerador de pedaços (bytes) da exportação.
+    A conexão fica emprestada enquanto o gerador é consumido e volta ao pool
+    quando ele termina ou é fechado (cliente desconectou).
+    """
+    if formato not in TIPOS_CONTEUDO:
+        raise ValueError(f"Formato inválido: {formato}")
+    _verificar_pyarrow(formato)
+    query, params = montar_consulta(tipo, colunar=formato in FORMATOS_COLUNARES, **filtros)
+    if formato == "arrow":
+        return _gerar_arrow(_lotes(query, params), schema_arrow(tipo))
+    if formato == "parquet":
+        return _gerar_parquet(_lotes(query, params), schema_arrow(tipo))
+    return _gerar(query, params, TABELAS[tipo]["colunas"], formato)
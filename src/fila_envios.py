@@ -0,0 +1,228 @@
+import os
+import time
+import uuid
+import heapq
+import smtplib
+import itertools
+import threading
+from enviar_email import SessaoSMTP, montar_mensagem, SMTP_CONFIG
+import relatorio_snapshot
+
+# Envio de relatórios em segundo plano: a API só enfileira. Um único thread
+# (o trabalho é esperar o servidor SMTP) mantém uma sessão SMTP aberta e
+# manda todos os envios pendentes nela. O relatório vem do snapshot da versão
+# atual dos dados (relatorio_snapshot), calculado uma vez para todos os envios.
+ENVIO_TENTATIVAS = int(os.getenv("ENVIO_TENTATIVAS", "5"))
+ENVIO_BACKOFF_SEGUNDOS = float(os.getenv("ENVIO_BACKOFF_SEGUNDOS", "5"))  # dobra a cada nova tentativa
+MAX_ENVIOS_GUARDADOS = 500
+NOME_ANEXO = "relatorio_metricas.csv"
+
+_envios = {}
+_agenda = []  # heap de (quando, sequência, id do envio)
+_sequencia = itertools.count()
+_condicao = threading.Condition()
+_thread = None
+_parar = False
+_sessao = None
+
+
+def _proximo_lote(espera_maxima: float):
+    """
+    Espera até haver envios vencidos na agenda e retorna todos eles.
+    Retorna [] se passou espera_maxima sem nada para fazer e None ao encerrar.
+    """
+    with _condicao:
+        limite = time.monotonic() + espera_maxima
+        while not _parar:
+            agora = time.monotonic()
+            if _agenda and _agenda[0][0] <= agora:
+                lote = []
+                while _agenda and _agenda[0][0] <= agora:
+                    lote.append(_envios[heapq.heappop(_agenda)[2]])
+                return lote
+            if agora >= limite:
+                return []
+            proximo = _agenda[0][0] if _agenda else limite
+            _condicao.wait(min(proximo, limite) - agora)
+        return None
+
+
+def _atualizar(envio: dict, **campos):
+    with _condicao:
+        envio.update(campos)
+
+
+def _enviar(envio: dict, texto: str, anexo: bytes):
+    corpo = f"{envio['corpo']}\n\n{texto}" if envio["corpo"] else texto
+    with _condicao:
+        envio["status"] = "enviando"
+        envio["tentativas"] += 1
+
+    for destinatario in envio["destinatarios"]:
+        if destinatario in envio["enviados"] or destinatario in envio["recusados"]:
+            continue
+        msg = montar_mensagem(destinatario, {NOME_ANEXO: anexo}, envio["assunto"], corpo)
+        try:
+            _sessao.enviar(msg, destinatario)
+        except smtplib.SMTPRecipientsRefused as e:
+            # Endereço recusado pelo servidor: tentar de novo não adianta
+            with _condicao:
+                envio["recusados"][destinatario] = str(e.recipients.get(destinatario, e))
+            continue
+        with _condicao:
+            envio["enviados"].append(destinatario)
+
+    with _condicao:
+        status = "enviado" if not envio["recusados"] else ("enviado_parcial" if envio["enviados"] else "erro")
+        envio.update(status=status, finalizado_em=time.time(), erro=None)
+    print(f"Envio {envio['id']}: {len(envio['enviados'])} e-mails enviados, {len(envio['recusados'])} recusados")
+
+
+def _falhou(envio: dict, erro: Exception):
+    with _condicao:
+        tentativas = envio["tentativas"]
+        desistir = tentativas >= ENVIO_TENTATIVAS
+        if desistir:
+            envio.update(status="erro", erro=str(erro), finalizado_em=time.time())
+        else:
+            espera = ENVIO_BACKOFF_SEGUNDOS * 2 ** (tentativas - 1)
+            envio.update(status="aguardando_nova_tentativa", erro=str(erro), proxima_tentativa_em=time.time() + espera)
+            heapq.heappush(_agenda, (time.monotonic() + espera, next(_sequencia), envio["id"]))
+    if desistir:
+        print(f"Envio {envio['id']} desistiu após {tentativas} tentativas: {erro}")
+    else:
+        print(f"Envio {envio['id']} falhou ({erro}), nova tentativa em {espera:g}s")
+
+
+def _processar_envio(envio: dict, snapshot: dict):
+    _atualizar(envio, snapshot_id=snapshot["id"], tempos_relatorio_ms=snapshot["tempos_ms"])
+    try:
+        _enviar(envio, snapshot["texto"], snapshot["csv"])
+    except Exception as e:
+        # Conexão/servidor com problema: descarta a sessão e reagenda
+        _sessao.fechar()
+        _falhou(envio, e)
+
+
+def _processar_lote(lote: list):
+    # Um relatório para o lote inteiro: o conteúdo é o mesmo para todos
+    try:
+        snapshot, erro_snapshot = relatorio_snapshot.obter_snapshot(), None
+    except Exception as e:
+        snapshot, erro_snapshot = None, e
+
+    for envio in lote:
+        try:
+            if snapshot is None:
+                with _condicao:
+                    envio["tentativas"] += 1
+                _falhou(envio, erro_snapshot)
+            else:
+                _processar_envio(envio, snapshot)
+        except Exception as e:
+            # Um envio com problema não pode derrubar o thread nem os outros do lote
+            print(f"Erro inesperado no envio {envio['id']}: {e}")
+            _atualizar(envio, status="erro", erro=str(e), finalizado_em=time.time())
+
+
+def _executar():
+    while True:
+        lote = _proximo_lote(SMTP_CONFIG["ociosa"])
+        if lote is None:
+            break
+        try:
+            if not lote:
+                # Nada para enviar há um tempo: não segura a sessão SMTP à toa
+                _sessao.fechar()
+                continue
+            _processar_lote(lote)
+        except Exception as e:
+            print(f"Erro inesperado na fila de envios: {e}")
+    _sessao.fechar()
+
+
+def iniciar():
+    global _thread, _parar, _sessao
+    with _condicao:
+        if _thread is not None:
+            return
+        _parar = False
+        _sessao = SessaoSMTP()
+        _thread = threading.Thread(target=_executar, name="fila-envios", daemon=True)
+        _thread.start()
+    print(f"Fila de envios iniciada ({SMTP_CONFIG['host']}:{SMTP_CONFIG['port']})")
+
+
+def encerrar(timeout: float = 10):
+    global _thread, _parar
+    with _condicao:
+        if _thread is None:
+            return
+        _parar = True
+        _condicao.notify_all()
+        thread = _thread
+    thread.join(timeout)
+    _thread = None
+
+
+def _limpar_envios_antigos():
+    finalizados = [e for e in _envios.values() if "finalizado_em" in e]
+    if len(finalizados) <= MAX_ENVIOS_GUARDADOS:
+        return
+    finalizados.sort(key=lambda e: e["finalizado_em"])
+    for envio in finalizados[:len(finalizados) - MAX_ENVIOS_GUARDADOS]:
+        del _envios[envio["id"]]
+
+
+def enfileirar(destinatarios: list, assunto: str, corpo: str = "") -> str:
+    """Agenda o envio do relatório e retorna o id imediatamente."""
+    iniciar()
+    envio_id = uuid.uuid4().hex
+    with _condicao:
+        _limpar_envios_antigos()
+        _envios[envio_id] = {
+            "id": envio_id,
+            "destinatarios": list(dict.fromkeys(destinatarios)),
+            "assunto": assunto,
+            "corpo": corpo,
+            "status": "na_fila",
+            "tentativas": 0,
+            "enviados": [],
+            "recusados": {},
+            "erro": None,
+            "criado_em": time.time(),
+        }
+        heapq.heappush(_agenda, (time.monotonic(), next(_sequencia), envio_id))
+        _condicao.notify_all()
+    return envio_id
+
+
+def _copiar(envio: dict) -> dict:
+    copia = {k: v for k, v in envio.items() if k != "corpo"}
+    copia["enviados"] = list(envio["enviados"])
+    copia["recusados"] = dict(envio["recusados"])
+    return copia
+
+
+def status_envio(envio_id: str):
+    with _condicao:
+        envio = _envios.get(envio_id)
+        return _copiar(envio) if envio else None
+
+
+def listar_envios() -> list:
+    with _condicao:
+        envios = [_copiar(e) for e in _envios.values()]
+    return sorted(envios, key=lambda e: e["criado_em"], reverse=True)
+
+
+def estatisticas() -> dict:
+    with _condicao:
+        por_status = {}
+        for envio in _envios.values():
+            por_status[envio["status"]] = por_status.get(envio["status"], 0) + 1
+        return {
+            "por_status": por_status,
+            "agendados": len(_agenda),
+            "conexoes_smtp": _sessao.conexoes if _sessao else 0,
+        }
@@ -0,0 +1,172 @@
+import os
+import time
+import uuid
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from importar import importar_csv
+import cache
+import analitico
+
+# Processos separados: o pandas da importação não disputa o GIL com a API
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "2"))
+MAX_JOBS_GUARDADOS = 500
+
+_executor = None
+_manager = None
+_progresso = None  # dict compartilhado: os workers escrevem, a API lê
+_jobs = {}
+_lock = threading.Lock()
+
+
+def _executar_importacao(job_id, progresso, filepath, tipo, modo, sha256, nome_arquivo):
+    """Roda dentro do processo worker."""
+    inicio = time.time()
+    progresso[job_id] = {"status": "processando", "iniciado_em": inicio}
+
+    def ao_progredir(stats):
+        segundos = time.time() - inicio
+        progresso[job_id] = {
+            "status": "processando",
+            "iniciado_em": inicio,
+            "linhas_lidas": stats["linhas_lidas"],
+            "duplicadas": stats["duplicadas"],
+            "blocos": stats["blocos"],
+            "linhas_por_segundo": round(stats["linhas_lidas"] / segundos) if segundos > 0 else 0,
+        }
+
+    return importar_csv(filepath, tipo, modo, sha256=sha256, nome_arquivo=nome_arquivo, ao_progredir=ao_progredir)
+
+
+def _novo_executor():
+    # spawn: não herda threads/conexões do processo da API
+    return ProcessPoolExecutor(max_workers=IMPORT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _reiniciar(quebrado):
+    """Worker morreu (ex.: falta de memória): troca o pool para as próximas importações."""
+    global _executor
+    with _lock:
+        if _executor is not quebrado:
+            return  # outro thread já trocou (ou a fila foi encerrada)
+        _executor = _novo_executor()
+    quebrado.shutdown(wait=False, cancel_futures=True)
+    print("Processo da fila de importação caiu; pool de workers reiniciado")
+
+
+def iniciar():
+    global _executor, _manager, _progresso
+    with _lock:
+        if _executor is not None:
+            return
+        _manager = multiprocessing.get_context("spawn").Manager()
+        _progresso = _manager.dict()
+        _executor = _novo_executor()
+        print(f"Fila de importação iniciada com {IMPORT_WORKERS} workers")
+
+
+def encerrar():
+    global _executor, _manager, _progresso
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        if _manager is not None:
+            _manager.shutdown()
+        _executor = _manager = _progresso = None
+
+
+def _ao_terminar(job_id, future, filepath, executor):
+    """Callback do future, roda num thread do processo da API."""
+    # O CSV só serve para esta importação: sai do disco em qualquer desfecho
+    try:
+        os.remove(filepath)
+    except OSError:
+        pass
+    if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+        _reiniciar(executor)
+    dados_alterados = False
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return
+        job["finalizado_em"] = time.time()
+        try:
+            carga = future.result()
+        except Exception as e:
+            job["status"] = "erro"
+            job["erro"] = str(e)
+            print(f"Erro na importação {job_id}: {e}")
+        else:
+            job["status"] = "ignorado" if carga["arquivo_repetido"] else "concluido"
+            job["carga"] = carga
+            dados_alterados = bool(carga["linhas"])
+        if _progresso is not None:
+            _progresso.pop(job_id, None)
+
+    if dados_alterados:
+        # Fora do _lock e do thread do executor: consultas de status e outros
+        # jobs não esperam a ida ao banco nem a reconstrução do snapshot
+        threading.Thread(target=_atualizar_caches, name=f"caches-{job_id}", daemon=True).start()
+
+
+def _atualizar_caches():
+    try:
+        # Os outros processos da API percebem a nova versão em até CACHE_VERSAO_SEGUNDOS
+        cache.expirar_versao()
+        analitico.atualizar()
+    except Exception as e:
+        print(f"Erro ao atualizar caches após importação: {e}")
+
+
+def _limpar_jobs_antigos():
+    finalizados = [j for j in _jobs.values() if "finalizado_em" in j]
+    if len(finalizados) <= MAX_JOBS_GUARDADOS:
+        return
+    finalizados.sort(key=lambda j: j["finalizado_em"])
+    for job in finalizados[:len(finalizados) - MAX_JOBS_GUARDADOS]:
+        del _jobs[job["id"]]
+
+
+def enfileirar(filepath: str, tipo: str, modo: str, sha256: str = None, nome_arquivo: str = None) -> str:
+    """Agenda a importação e retorna o id do job imediatamente."""
+    iniciar()
+    job_id = uuid.uuid4().hex
+    with _lock:
+        _limpar_jobs_antigos()
+        _jobs[job_id] = {
+            "id": job_id,
+            "arquivo": nome_arquivo or os.path.basename(filepath),
+            "tipo": tipo,
+            "modo": modo,
+            "status": "na_fila",
+            "criado_em": time.time(),
+        }
+        executor = _executor
+    try:
+        future = executor.submit(_executar_importacao, job_id, _progresso, filepath, tipo, modo, sha256, nome_arquivo)
+    except BrokenProcessPool:
+        # Pool morreu antes de algum callback perceber: troca e tenta de novo
+        _reiniciar(executor)
+        executor = _executor
+        future = executor.submit(_executar_importacao, job_id, _progresso, filepath, tipo, modo, sha256, nome_arquivo)
+    future.add_done_callback(lambda f: _ao_terminar(job_id, f, filepath, executor))
+    return job_id
+
+
+def status_job(job_id: str):
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        job = dict(job)
+    if job["status"] == "na_fila" and _progresso is not None:
+        job.update(_progresso.get(job_id, {}))
+    return job
+
+
+def listar_jobs() -> list:
+    with _lock:
+        ids = list(_jobs)
+    jobs = [status_job(job_id) for job_id in ids]
+    return sorted((j for j in jobs if j), key=lambda j: j["criado_em"], reverse=True)
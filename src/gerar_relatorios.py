@@ -1,5 +1,8 @@
+import os
+import time
 import pandas as pd
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 from db import get_connection
 
 def df_to_bytes(df: pd.DataFrame) -> bytes:
@@ -9,136 +12,227 @@ def df_to_bytes(df: pd.DataFrame) -> bytes:
     return buffer.read()
 
 
-def gerar_relatorios():
-    """
-    Gera métricas resumidas das últimas 52 semanas.
-    Retorna um dicionário com valor e descrição para cada métrica.
-    """
-    import locale
-    locale.setlocale(locale.LC_ALL, 'pt_BR.UTF-8')
+def metricas_para_bytes(metricas) -> bytes:
+    cleaned = {}
+    for chave, valor in metricas.items():
+        if isinstance(valor, dict):
+            cleaned[chave] = {
+                sub_k: (", ".join(sub_v) if isinstance(sub_v, list) else sub_v)
+                for sub_k, sub_v in valor.items()
+            }
+        else:
+            cleaned[chave] = valor
 
-    connection = get_connection()
+    df = pd.DataFrame.from_dict(cleaned, orient="index")
+    buffer = BytesIO()
+    df.to_csv(buffer, index=True, encoding="utf-8")
+    buffer.seek(0)
+    return buffer.read()
 
-    metricas = {
-        "estoque_consumido_toneladas": """
-            SELECT ROUND(SUM(e.es_totalestoque) / 1000, 2) AS valor
-            FROM domrock.estoque e
-            WHERE e.data >= CURRENT_DATE - INTERVAL '52 weeks';
-        """,
-        "frequencia_compra_meses": """
-            SELECT COUNT(DISTINCT TO_CHAR(v.data, 'YYYY-MM')) AS valor
-            FROM domrock.vendas v
-            WHERE v.zs_peso_liquido > 0
-              AND v.data >= CURRENT_DATE - INTERVAL '52 weeks';
-        """,
-        "aging_medio_semanas": """
-            SELECT ROUND(AVG(e.dias_em_estoque) / 7, 2) AS valor
-            FROM domrock.estoque e
-            WHERE e.data >= CURRENT_DATE - INTERVAL '52 weeks';
-        """,
-        "clientes_consumiram_SKU_1": """
-            SELECT COUNT(DISTINCT v.cod_cliente) AS valor
+
+def metricas_para_texto(metricas: dict) -> str:
+    linhas = []
+    for chave, valor in metricas.items():
+        if isinstance(valor, dict) and 'descricao' in valor:
+            linhas.append(valor['descricao'])
+        else:
+            linhas.append(f"{chave}: {valor}")
+    return "\n".join(linhas)
+
+
+# Consultas independentes, executadas em paralelo (uma conexão do pool cada)
+CONSULTAS_PARALELAS = int(os.getenv("RELATORIO_CONSULTAS_PARALELAS", "5"))
+
+# Consultas das métricas (também usadas por benchmarks/explain_consultas.py).
+# Métricas que leem a mesma janela da mesma tabela saem de uma única passada.
+CONSULTAS_RELATORIO = {
+    # estoque_consumido_toneladas + aging_medio_semanas
+    "estoque_52_semanas": """
+        SELECT ROUND(SUM(e.es_totalestoque) / 1000, 2) AS estoque_consumido_toneladas,
+               ROUND(AVG(e.dias_em_estoque) / 7, 2) AS aging_medio_semanas
+        FROM domrock.estoque e
+        WHERE e.data >= CURRENT_DATE - INTERVAL '52 weeks'
+    """,
+    # frequencia_compra_meses + consumo semanal do SKU_1 (risco_desabastecimento_SKU_1).
+    # Agrupar por mês antes de contar evita o sort de um COUNT(DISTINCT) na janela toda.
+    "vendas_52_semanas": """
+        SELECT COUNT(*) FILTER (WHERE m.teve_compra) AS frequencia_compra_meses,
+               ROUND(SUM(m.consumo_sku_1) / 52, 4) AS consumo
+        FROM (
+            SELECT DATE_TRUNC('month', v.data) AS mes,
+                   BOOL_OR(v.zs_peso_liquido > 0) AS teve_compra,
+                   SUM(v.zs_peso_liquido) FILTER (WHERE v.SKU = 'SKU_1') AS consumo_sku_1
             FROM domrock.vendas v
-            WHERE v.SKU = 'SKU_1'
-              AND v.zs_peso_liquido > 0;
-        """,
-        "skus_alto_giro_sem_estoque": """
-            SELECT v.SKU, ROUND(COALESCE(SUM(e.es_totalestoque),0), 2) AS estoque_total,
-                   AVG(v.giro_sku_cliente) AS giro_medio
+            WHERE v.data >= CURRENT_DATE - INTERVAL '52 weeks'
+            GROUP BY 1
+        ) m
+    """,
+    # clientes_consumiram_SKU_1 (histórico todo, pelo índice de SKU)
+    "clientes_sku_1": """
+        SELECT COUNT(DISTINCT v.cod_cliente) AS clientes_consumiram_SKU_1
+        FROM domrock.vendas v
+        WHERE v.SKU = 'SKU_1'
+          AND v.zs_peso_liquido > 0
+    """,
+    # estoque atual do SKU_1 (risco_desabastecimento_SKU_1)
+    "estoque_atual_sku_1": """
+        SELECT ROUND(SUM(e.es_totalestoque), 4) AS estoque
+        FROM domrock.estoque e
+        WHERE e.SKU = 'SKU_1'
+          AND e.data = (SELECT MAX(data) FROM domrock.estoque WHERE SKU = 'SKU_1')
+    """,
+    # skus_alto_giro_sem_estoque + itens_para_repor.
+    # Vendas e estoque são agregados por SKU antes da junção, em vez de juntar
+    # linha a linha (vendas x estoque do mesmo SKU). A junção antiga somava o
+    # estoque uma vez para cada venda do SKU; multiplicar pelo número de vendas
+    # mantém exatamente o mesmo critério.
+    "skus": """
+        WITH vendas_sku AS (
+            SELECT v.SKU,
+                   COUNT(*) AS linhas,
+                   COUNT(*) FILTER (WHERE v.giro_sku_cliente > 20) AS linhas_alto_giro,
+                   AVG(v.giro_sku_cliente) FILTER (WHERE v.giro_sku_cliente > 20) AS giro_medio
             FROM domrock.vendas v
-            LEFT JOIN domrock.estoque e ON v.SKU = e.SKU
             WHERE v.data >= CURRENT_DATE - INTERVAL '52 weeks'
-              AND v.giro_sku_cliente > 20
             GROUP BY v.SKU
-            HAVING COALESCE(SUM(e.es_totalestoque), 0) <= 0.01
-            ORDER BY giro_medio DESC
-            LIMIT 10;
-        """,
-        "itens_para_repor": """
-            SELECT e.SKU, ROUND(SUM(e.es_totalestoque), 2) AS estoque_total
+        ), estoque_sku AS (
+            SELECT e.SKU,
+                   SUM(e.es_totalestoque) AS total,
+                   SUM(e.es_totalestoque) FILTER (WHERE e.data >= CURRENT_DATE - INTERVAL '52 weeks') AS total_52_semanas
             FROM domrock.estoque e
-            JOIN domrock.vendas v ON e.SKU = v.SKU
-            WHERE e.data >= CURRENT_DATE - INTERVAL '52 weeks'
-              AND v.data >= CURRENT_DATE - INTERVAL '52 weeks'
             GROUP BY e.SKU
-            HAVING SUM(e.es_totalestoque) <= 0.5
-            ORDER BY estoque_total ASC
-            LIMIT 10;
-        """,
-        "risco_desabastecimento_SKU_1": """
-            WITH consumo_medio_semanal AS (
-                SELECT ROUND(SUM(v.zs_peso_liquido) / 52, 4) AS consumo
-                FROM domrock.vendas v
-                WHERE v.SKU = 'SKU_1'
-                  AND v.data >= CURRENT_DATE - INTERVAL '52 weeks'
-            ), estoque_atual AS (
-                SELECT ROUND(SUM(e.es_totalestoque), 4) AS estoque
-                FROM domrock.estoque e
-                WHERE e.SKU = 'SKU_1'
-                  AND e.data = (SELECT MAX(data) FROM domrock.estoque WHERE SKU = 'SKU_1')
-            )
-            SELECT e.estoque, c.consumo,
-                   CASE 
-                     WHEN e.estoque < c.consumo THEN 'Alto'
-                     WHEN e.estoque < 2*c.consumo THEN 'Médio'
-                     ELSE 'Baixo'
-                   END AS risco
-            FROM estoque_atual e, consumo_medio_semanal c;
-        """
-    }
-
-    descricoes = {
-        "estoque_consumido_toneladas": "Quantidade de estoque consumido nas últimas 52 semanas: {valor:.2f} toneladas.",
-        "frequencia_compra_meses": "A empresa realizou compras em {valor:.0f} dos últimos 12 meses.",
-        "aging_medio_semanas": "O tempo médio que o estoque permanece armazenado é de {valor:.2f} semanas.",
-        "clientes_consumiram_SKU_1": "{valor:.0f} clientes compraram o material SKU_1 nas últimas 52 semanas.",
-        "skus_alto_giro_sem_estoque": "SKUs de alto giro e alta frequência que estão sem estoque: {descricao}.",
-        "itens_para_repor": "Itens que precisam ser repostos no estoque (estoque baixo e vendas recentes): {descricao}.",
-        "risco_desabastecimento_SKU_1": "O risco de desabastecimento do SKU_1 é {descricao} (estoque atual: {estoque:.2f} toneladas, consumo médio semanal: {consumo:.2f} toneladas)."
-    }
+        ), alto_giro AS (
+            SELECT v.SKU, ROW_NUMBER() OVER (ORDER BY v.giro_medio DESC) AS ordem
+            FROM vendas_sku v
+            LEFT JOIN estoque_sku e ON v.SKU = e.SKU
+            WHERE v.linhas_alto_giro > 0
+              AND COALESCE(e.total * v.linhas_alto_giro, 0) <= 0.01
+        ), repor AS (
+            SELECT e.SKU, ROW_NUMBER() OVER (ORDER BY ROUND(e.total_52_semanas * v.linhas, 2)) AS ordem
+            FROM estoque_sku e
+            JOIN vendas_sku v ON e.SKU = v.SKU
+            WHERE e.total_52_semanas * v.linhas <= 0.5
+        )
+        SELECT 'skus_alto_giro_sem_estoque' AS metrica, SKU, ordem FROM alto_giro WHERE ordem <= 10
+        UNION ALL
+        SELECT 'itens_para_repor', SKU, ordem FROM repor WHERE ordem <= 10
+        ORDER BY metrica, ordem
+    """,
+}
+
+# Métricas produzidas por cada consulta (para atribuir os tempos)
+METRICAS_POR_CONSULTA = {
+    "estoque_52_semanas": ["estoque_consumido_toneladas", "aging_medio_semanas"],
+    "vendas_52_semanas": ["frequencia_compra_meses", "risco_desabastecimento_SKU_1"],
+    "clientes_sku_1": ["clientes_consumiram_SKU_1"],
+    "estoque_atual_sku_1": ["risco_desabastecimento_SKU_1"],
+    "skus": ["skus_alto_giro_sem_estoque", "itens_para_repor"],
+}
+
+DESCRICOES = {
+    "estoque_consumido_toneladas": "Quantidade de estoque consumido nas últimas 52 semanas: {valor:.2f} toneladas.",
+    "frequencia_compra_meses": "A empresa realizou compras em {valor:.0f} dos últimos 12 meses.",
+    "aging_medio_semanas": "O tempo médio que o estoque permanece armazenado é de {valor:.2f} semanas.",
+    "clientes_consumiram_SKU_1": "{valor:.0f} clientes compraram o material SKU_1 nas últimas 52 semanas.",
+    "skus_alto_giro_sem_estoque": "SKUs de alto giro e alta frequência que estão sem estoque: {descricao}.",
+    "itens_para_repor": "Itens que precisam ser repostos no estoque (estoque baixo e vendas recentes): {descricao}.",
+    "risco_desabastecimento_SKU_1": "O risco de desabastecimento do SKU_1 é {descricao} (estoque atual: {estoque:.2f} toneladas, consumo médio semanal: {consumo:.2f} toneladas)."
+}
+
 
+def _executar_consulta(nome: str, sql: str):
+    """Roda uma consulta numa conexão própria do pool; retorna (linhas como dicts, ms)."""
+    inicio = time.perf_counter()
+    with get_connection() as connection, connection.cursor() as cursor:
+        cursor.execute(sql)
+        colunas = [desc[0] for desc in cursor.description]
+        linhas = [dict(zip(colunas, linha)) for linha in cursor.fetchall()]
+    return linhas, (time.perf_counter() - inicio) * 1000
+
+
+def _metrica_valor(nome: str, valor):
+    valor = float(valor) if valor is not None else 0.0
+    return {"valor": valor, "descricao": DESCRICOES[nome].format(valor=valor)}
+
+
+def _metrica_skus(nome: str, skus: list):
+    descricao = ", ".join(skus) if skus else "Nenhum SKU encontrado."
+    return {"valor": len(skus), "descricao": DESCRICOES[nome].format(descricao=descricao)}
+
+
+def _metrica_risco(estoque, consumo):
+    # Mesmo CASE da consulta antiga: comparação com NULL cai no 'Baixo'
+    if estoque is not None and consumo is not None and estoque < consumo:
+        risco = "Alto"
+    elif estoque is not None and consumo is not None and estoque < 2 * consumo:
+        risco = "Médio"
+    else:
+        risco = "Baixo"
+    texto = DESCRICOES["risco_desabastecimento_SKU_1"].format(
+        descricao=risco,
+        estoque=float(estoque) if estoque is not None else 0.0,
+        consumo=float(consumo) if consumo is not None else 0.0,
+    )
+    return {"valor": None, "descricao": texto}
+
+
+def _montar_metricas(linhas: dict) -> dict:
+    """Converte as linhas de cada consulta nas métricas, na ordem de sempre."""
     resultados = {}
+    if "estoque_52_semanas" in linhas:
+        estoque = linhas["estoque_52_semanas"][0]
+        resultados["estoque_consumido_toneladas"] = _metrica_valor("estoque_consumido_toneladas", estoque["estoque_consumido_toneladas"])
+    if "vendas_52_semanas" in linhas:
+        resultados["frequencia_compra_meses"] = _metrica_valor("frequencia_compra_meses", linhas["vendas_52_semanas"][0]["frequencia_compra_meses"])
+    if "estoque_52_semanas" in linhas:
+        resultados["aging_medio_semanas"] = _metrica_valor("aging_medio_semanas", linhas["estoque_52_semanas"][0]["aging_medio_semanas"])
+    if "clientes_sku_1" in linhas:
+        resultados["clientes_consumiram_SKU_1"] = _metrica_valor("clientes_consumiram_SKU_1", linhas["clientes_sku_1"][0]["clientes_consumiram_sku_1"])
+    if "skus" in linhas:
+        for nome in ("skus_alto_giro_sem_estoque", "itens_para_repor"):
+            skus = [str(l["sku"]) for l in linhas["skus"] if l["metrica"] == nome]
+            resultados[nome] = _metrica_skus(nome, skus)
+    if "vendas_52_semanas" in linhas and "estoque_atual_sku_1" in linhas:
+        resultados["risco_desabastecimento_SKU_1"] = _metrica_risco(
+            linhas["estoque_atual_sku_1"][0]["estoque"], linhas["vendas_52_semanas"][0]["consumo"]
+        )
+    return resultados
+
+
+def gerar_relatorios(com_tempos: bool = False):
+    """
+    Gera métricas resumidas das últimas 52 semanas.
+    Retorna um dicionário com valor e descrição para cada métrica.
+    Com com_tempos=True, retorna também o tempo (ms) de cada métrica, que é o
+    tempo da consulta que a calculou.
+    """
+    import locale
+    locale.setlocale(locale.LC_ALL, 'pt_BR.UTF-8')
+
+    inicio = time.perf_counter()
+    linhas, tempos_consultas, erros = {}, {}, []
+
+    with ThreadPoolExecutor(max_workers=CONSULTAS_PARALELAS) as executor:
+        futuros = {nome: executor.submit(_executar_consulta, nome, sql) for nome, sql in CONSULTAS_RELATORIO.items()}
+        for nome, futuro in futuros.items():
+            try:
+                linhas[nome], tempos_consultas[nome] = futuro.result()
+            except Exception as e:
+                print(f"Erro ao calcular métricas ({nome}): {e}")
+                erros.append(str(e))
+
+    resultados = _montar_metricas(linhas)
+    if erros:
+        resultados["erro"] = "; ".join(erros)
 
-    try:
-        for nome, sql in metricas.items():
-            df = pd.read_sql_query(sql, connection)
-
-            if nome in ["skus_alto_giro_sem_estoque", "itens_para_repor"]:
-                if df.empty:
-                    texto = descricoes[nome].format(descricao="Nenhum SKU encontrado.")
-                else:
-                    if "SKU" in df.columns:
-                        skus_list = df["SKU"].astype(str).tolist()
-                    elif "sku" in df.columns:
-                        skus_list = df["sku"].astype(str).tolist()
-                    else:
-                        skus_list = []
-                    texto = descricoes[nome].format(descricao=", ".join(skus_list))
-                resultados[nome] = {"valor": len(df), "descricao": texto}
-
-            elif nome == "risco_desabastecimento_SKU_1":
-                if df.empty:
-                    texto = "Não foi possível calcular o risco de desabastecimento para SKU_1."
-                    valor = None
-                else:
-                    linha = df.iloc[0]
-                    estoque = float(linha["estoque"]) if linha["estoque"] is not None else 0.0
-                    consumo = float(linha["consumo"]) if linha["consumo"] is not None else 0.0
-                    risco = linha["risco"] if linha["risco"] is not None else "Desconhecido"
-                    texto = descricoes[nome].format(descricao=risco, estoque=estoque, consumo=consumo)
-                    valor = None
-                resultados[nome] = {"valor": valor, "descricao": texto}
-
-            else:
-                valor = float(df.iloc[0]["valor"]) if not df.empty and df.iloc[0]["valor"] is not None else 0.0
-                texto = descricoes[nome].format(valor=valor)
-                resultados[nome] = {"valor": valor, "descricao": texto}
-
-    except Exception as e:
-        print(f"Erro ao calcular métricas: {e}")
-        resultados["erro"] = str(e)
-
-    finally:
-        connection.close()
+    tempos = {}
+    for consulta, metricas in METRICAS_POR_CONSULTA.items():
+        for metrica in metricas:
+            if consulta in tempos_consultas:
+                tempos[metrica] = round(max(tempos.get(metrica, 0.0), tempos_consultas[consulta]), 2)
+    tempos["total"] = round((time.perf_counter() - inicio) * 1000, 2)
+    print("Tempos das métricas (ms):", tempos)
 
+    if com_tempos:
+        return resultados, tempos
     return resultados
@@ -1,106 +1,287 @@
+import hashlib
+import os
+import time
 import pandas as pd
+from io import StringIO
 from db import get_connection
 from normalizar import tratar_dados
+from rollups import atualizar_rollups
+from cache import marcar_dados_alterados
 from psycopg2.extras import execute_values
 
 
-def inserir_clientes(df: pd.DataFrame):
-    connection = get_connection()
-    cursor = connection.cursor()
-    try:
-        clientes = df["cod_cliente"].drop_duplicates().dropna().tolist()
-        if not clientes:
-            return
-        query = """
-            INSERT INTO domrock.clientes (cod_cliente)
-            VALUES %s
-            ON CONFLICT (cod_cliente) DO NOTHING
-        """
-        execute_values(cursor, query, [(c,) for c in clientes])
-        connection.commit()
-        print(f"{len(clientes)} clientes únicos processados.")
-    except Exception as e:
-        connection.rollback()
-        print(f"Erro ao inserir clientes: {e}")
-    finally:
-        cursor.close()
-        connection.close()
+def _estatisticas_carga(linhas: int, inicio: float) -> dict:
+    segundos = time.perf_counter() - inicio
+    return {
+        "linhas": linhas,
+        "segundos": round(segundos, 3),
+        "linhas_por_segundo": round(linhas / segundos) if segundos > 0 else linhas,
+    }
 
 
-def inserir_produtos(df: pd.DataFrame):
-    connection = get_connection()
-    cursor = connection.cursor()
-    try:
-        produtos = df["cod_produto"].drop_duplicates().dropna().tolist()
-        if not produtos:
-            return
-        query = """
-            INSERT INTO domrock.produtos (cod_produto)
-            VALUES %s
-            ON CONFLICT (cod_produto) DO NOTHING
+def inserir_dados(cursor, df: pd.DataFrame, tabela: str, colunas: list):
+    # Monta a query dinâmica
+    cols = ",".join(colunas)
+    query = f"""
+        INSERT INTO {tabela} ({cols})
+        VALUES %s
+    """
+
+    # Converte o DataFrame em lista de tuplas; NaT/NA viram None (NULL), como no COPY
+    dados = df[colunas].astype(object)
+    values = [tuple(x) for x in dados.where(dados.notna(), None).to_numpy()]
+
+    # Inserção em lote (tamanho configurável para controle de memória)
+    execute_values(cursor, query, values, page_size=1000)
+
+
+def copiar_dados(cursor, df: pd.DataFrame, tabela: str, colunas: list):
+    """
+    Carga via COPY FROM STDIN: o DataFrame vira um CSV em memória que o
+    Postgres lê direto, sem montar tuplas Python nem um INSERT por página.
+    """
+    buffer = StringIO()
+    df.to_csv(buffer, columns=colunas, index=False, header=False, date_format="%Y-%m-%d")
+    buffer.seek(0)
+
+    cols = ",".join(colunas)
+    cursor.copy_expert(f"COPY {tabela} ({cols}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def _criar_staging(cursor, tipo: str, colunas: list) -> str:
+    """
+    Tabela temporária com as mesmas colunas do destino e sem restrições.
+    Tabelas temporárias não geram WAL (como UNLOGGED), são visíveis só para
+    esta conexão e somem no fim da transação.
+    """
+    staging = f"staging_{tipo}"
+    cols = ",".join(colunas)
+    cursor.execute(
+        f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS SELECT {cols} FROM domrock.{tipo} WITH NO DATA"
+    )
+    return staging
+
+
+def _garantir_particoes(cursor, tipo: str, staging: str):
+    """
+    Se a tabela foi particionada (sql/migrations/opcionais), cria as partições
+    mensais que o arquivo precisa antes de gravar.
+    """
+    cursor.execute("SELECT to_regprocedure(%s) IS NOT NULL", (f"domrock.criar_particoes_{tipo}(date,date)",))
+    if cursor.fetchone()[0]:
+        cursor.execute(f"SELECT domrock.criar_particoes_{tipo}(MIN(data), MAX(data)) FROM {staging}")
+
+
+def _mesclar_staging(cursor, tipo: str, staging: str, colunas: list) -> tuple:
+    """
+    Deriva clientes/produtos e copia a staging para a tabela final, tudo em SQL.
+    Retorna {"linhas": inseridas, "sem_data": ignoradas por falta de data,
+    "duplicadas": repetidas dentro do próprio arquivo}.
+    """
+    cursor.execute(f"""
+        INSERT INTO domrock.clientes (cod_cliente)
+        SELECT DISTINCT cod_cliente FROM {staging} WHERE cod_cliente IS NOT NULL
+        ON CONFLICT (cod_cliente) DO NOTHING
+    """)
+    print(f"{cursor.rowcount} clientes novos.")
+
+    cursor.execute(f"""
+        INSERT INTO domrock.produtos (cod_produto)
+        SELECT DISTINCT cod_produto FROM {staging} WHERE cod_produto IS NOT NULL
+        ON CONFLICT (cod_produto) DO NOTHING
+    """)
+    print(f"{cursor.rowcount} produtos novos.")
+
+    _garantir_particoes(cursor, tipo, staging)
+
+    # Data que não pôde ser lida vira NULL no tratamento: a linha não entra
+    # (data é obrigatória e, nula, escaparia da chave única de hash_linha)
+    cols = ",".join(colunas)
+    cursor.execute(f"""
+        SELECT COUNT(*) FILTER (WHERE data IS NULL),
+               COUNT(*) FILTER (WHERE data IS NOT NULL)
+               - COUNT(DISTINCT md5(ROW({cols})::text)) FILTER (WHERE data IS NOT NULL)
+        FROM {staging}
+    """)
+    sem_data, duplicadas = cursor.fetchone()
+    if sem_data:
+        print(f"{sem_data} linhas sem data válida ignoradas.")
+
+    # hash_linha identifica a linha pelas colunas de negócio; linhas repetidas
+    # no arquivo (inclusive entre blocos) e linhas que já estão no banco
+    # (reenvio ou arquivo com sobreposição) são ignoradas
+    cursor.execute(f"""
+        INSERT INTO domrock.{tipo} ({cols}, hash_linha)
+        SELECT {cols}, md5(ROW({cols})::text) FROM {staging}
+        WHERE data IS NOT NULL
+        ON CONFLICT DO NOTHING
+    """)
+    return {"linhas": cursor.rowcount, "sem_data": sem_data, "duplicadas": duplicadas}
+
+
+def sha256_arquivo(filepath: str) -> str:
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as arquivo:
+        while bloco := arquivo.read(2**20):
+            digest.update(bloco)
+    return digest.hexdigest()
+
+
+def _registrar_importacao(cursor, tipo: str, nome_arquivo: str, sha256: str):
+    """
+    Registra o arquivo no início da transação. Se o mesmo conteúdo já foi
+    importado, retorna None. Uploads simultâneos do mesmo arquivo esperam um
+    pelo outro na chave única (tipo, sha256).
+    """
+    cursor.execute(
         """
-        execute_values(cursor, query, [(p,) for p in produtos])
-        connection.commit()
-        print(f"{len(produtos)} produtos únicos processados.")
-    except Exception as e:
-        connection.rollback()
-        print(f"Erro ao inserir produtos: {e}")
-    finally:
-        cursor.close()
-        connection.close()
+        INSERT INTO domrock.importacoes (tipo, arquivo, sha256)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (tipo, sha256) DO NOTHING
+        RETURNING id
+        """,
+        (tipo, nome_arquivo, sha256)
+    )
+    registro = cursor.fetchone()
+    return registro[0] if registro else None
+
+
+MODOS_CARGA = {
+    "copy": copiar_dados,
+    "insert": inserir_dados,
+}
+
+COLUNAS = {
+    "vendas": [
+        "data", "cod_cliente", "cod_produto", "lote", "origem", "zs_gr_mercad",
+        "produto", "zs_centro", "zs_cidade", "zs_uf", "SKU",
+        "zs_peso_liquido", "giro_sku_cliente"
+    ],
+    "estoque": [
+        "data", "cod_cliente", "cod_produto", "es_centro", "tipo_material",
+        "origem", "lote", "dias_em_estoque", "produto", "grupo_mercadoria",
+        "es_totalestoque", "SKU"
+    ],
+}
+
+# Colunas numéricas de cada tipo; o resto é lido como texto para que a
+# inferência de tipos do pandas não mude de um bloco para outro
+COLUNAS_NUMERICAS = {
+    "vendas": {"zs_peso_liquido", "giro_sku_cliente"},
+    "estoque": {"es_totalestoque", "dias_em_estoque"},
+}
+
+IMPORT_CONFIG = {
+    "linhas_por_bloco": int(os.getenv("IMPORT_LINHAS_POR_BLOCO", "100000")),
+    "memoria_maxima_mb": int(os.getenv("IMPORT_MEMORIA_MAXIMA_MB", "512")),
+}
+
+LINHAS_AMOSTRA = 1000        # primeiro bloco, usado para estimar bytes por linha
+LINHAS_MINIMAS_BLOCO = 500   # abaixo disso a importação vira uma sequência de micro-cargas
+FATOR_MEMORIA_BLOCO = 3      # bloco bruto + bloco tratado + buffer do COPY
+
 
+def _tamanho_proximo_bloco(bytes_por_linha: float, linhas_por_bloco: int, teto_bytes: int) -> int:
+    """Quantas linhas cabem no próximo bloco sem passar do teto de memória (0 se nenhuma)."""
+    cabem = int(teto_bytes / (bytes_por_linha * FATOR_MEMORIA_BLOCO))
+    if cabem < min(LINHAS_MINIMAS_BLOCO, linhas_por_bloco):
+        return 0
+    return min(linhas_por_bloco, cabem)
 
-def inserir_dados(df: pd.DataFrame, tabela: str, colunas: list):
-    connection = get_connection()
-    cursor = connection.cursor()
 
+def importar_csv(filepath: str, tipo: str, modo: str = "copy", linhas_por_bloco: int = None, memoria_maxima_mb: int = None,
+                 sha256: str = None, nome_arquivo: str = None, ao_progredir=None):
+    """
+    Lê o CSV em blocos, trata e carrega cada bloco numa tabela de staging antes
+    de ler o próximo, respeitando um teto de memória. A deduplicação entre
+    blocos fica com o banco (hash_linha), então a memória não cresce com o
+    tamanho do arquivo.
+    No fim, clientes, produtos e a tabela final são preenchidos a partir da
+    staging numa única transação: ou entra o arquivo todo, ou nada. Os agregados
+    dos dashboards (rollups.py) dos dias do arquivo são recalculados na mesma
+    transação.
+    Arquivos já importados (mesmo sha256) são ignorados e, dentro de um arquivo
+    novo, só entram as linhas que ainda não estão no banco.
+    ao_progredir, se informado, recebe uma cópia das estatísticas após cada bloco.
+    modo="copy" usa COPY FROM STDIN; modo="insert" usa INSERT em lotes.
+    Retorna as estatísticas da carga.
+    """
+    if tipo not in COLUNAS:
+        raise ValueError("Tipo inválido. Use 'vendas' ou 'estoque'.")
+    if modo not in MODOS_CARGA:
+        raise ValueError(f"Modo de carga inválido. Use um de: {', '.join(MODOS_CARGA)}.")
+    carregar = MODOS_CARGA[modo]
+    colunas = COLUNAS[tipo]
+    linhas_por_bloco = linhas_por_bloco or IMPORT_CONFIG["linhas_por_bloco"]
+    teto_bytes = (memoria_maxima_mb or IMPORT_CONFIG["memoria_maxima_mb"]) * 2**20
+
+    inicio = time.perf_counter()
+    stats = {"linhas": 0, "linhas_lidas": 0, "duplicadas": 0, "ja_existentes": 0, "sem_data": 0, "blocos": 0, "arquivo_repetido": False}
+    sha256 = sha256 or sha256_arquivo(filepath)
+
+    dtypes = {c: str for c in colunas if c not in COLUNAS_NUMERICAS[tipo]}
     try:
-        # Inserir clientes e produtos primeiro
-        inserir_clientes(df)
-        inserir_produtos(df)
-
-        # Monta a query dinâmica
-        cols = ",".join(colunas)
-        query = f"""
-            INSERT INTO {tabela} ({cols})
-            VALUES %s
-        """
+        # Uma conexão e uma transação para a importação inteira
+        with get_connection() as connection, connection.cursor() as cursor:
+            id_importacao = _registrar_importacao(cursor, tipo, nome_arquivo or os.path.basename(filepath), sha256)
+            if id_importacao is None:
+                print(f"{filepath} já foi importado antes (sha256 {sha256[:12]}...), nada a fazer.")
+                stats["arquivo_repetido"] = True
+                return stats
+
+            staging = _criar_staging(cursor, tipo, colunas)
 
-        # Converte o DataFrame em lista de tuplas (melhor performance)
-        values = [tuple(x) for x in df[colunas].to_numpy()]
+            with pd.read_csv(filepath, sep="|", dtype=dtypes, chunksize=LINHAS_AMOSTRA) as leitor:
+                tamanho = min(LINHAS_AMOSTRA, linhas_por_bloco)
+                while True:
+                    try:
+                        bloco = leitor.get_chunk(max(tamanho, 1))
+                    except StopIteration:
+                        break
+                    if tamanho == 0:
+                        # Ainda há linhas no arquivo, mas não cabem no teto configurado
+                        raise MemoryError(
+                            f"Teto de memória da importação ({teto_bytes // 2**20} MB) atingido após {stats['linhas_lidas']} linhas"
+                        )
 
-        # Inserção em lote (tamanho configurável para controle de memória)
-        execute_values(cursor, query, values, page_size=1000)
+                    bytes_por_linha = bloco.memory_usage(deep=True).sum() / max(len(bloco), 1)
+                    linhas_bloco = len(bloco)
 
-        connection.commit()
-        print(f"{len(df)} registros inseridos em {tabela}.")
+                    # drop_duplicates do tratamento cobre o bloco; entre blocos, o merge
+                    df_tratado = tratar_dados(bloco, tipo)
+                    del bloco
+                    stats["linhas_lidas"] += linhas_bloco
+                    stats["duplicadas"] += linhas_bloco - len(df_tratado)
+
+                    if not df_tratado.empty:
+                        carregar(cursor, df_tratado, staging, colunas)
+                    stats["blocos"] += 1
+                    del df_tratado
+                    if ao_progredir:
+                        ao_progredir(dict(stats))
+
+                    tamanho = _tamanho_proximo_bloco(bytes_por_linha, linhas_por_bloco, teto_bytes)
+
+            mescla = _mesclar_staging(cursor, tipo, staging, colunas)
+            stats.update(linhas=mescla["linhas"], sem_data=mescla["sem_data"])
+            stats["duplicadas"] += mescla["duplicadas"]
+            if stats["linhas"]:
+                # Agregados dos dashboards: só os dias do arquivo, na mesma transação
+                atualizar_rollups(cursor, tipo, staging)
+                # Invalida os caches de dashboards/chatbot quando o commit acontecer
+                marcar_dados_alterados(cursor)
+            stats["ja_existentes"] = stats["linhas_lidas"] - stats["duplicadas"] - stats["sem_data"] - stats["linhas"]
+            cursor.execute(
+                "UPDATE domrock.importacoes SET linhas_lidas = %s, linhas_inseridas = %s WHERE id = %s",
+                (stats["linhas_lidas"], stats["linhas"], id_importacao)
+            )
     except Exception as e:
-        connection.rollback()
-        print(f"Erro ao inserir em {tabela}: {e}")
-    finally:
-        cursor.close()
-        connection.close()
-
-
-def importar_csv(filepath: str, tipo: str):
-    df = pd.read_csv(filepath, sep="|")
-    df_tratado = tratar_dados(df, tipo)
-
-    if tipo == "vendas":
-        colunas = [
-            "data", "cod_cliente", "cod_produto", "lote", "origem", "zs_gr_mercad",
-            "produto", "zs_centro", "zs_cidade", "zs_uf", "SKU",
-            "zs_peso_liquido", "giro_sku_cliente"
-        ]
-        inserir_dados(df_tratado, "domrock.vendas", colunas)
-
-    elif tipo == "estoque":
-        colunas = [
-            "data", "cod_cliente", "cod_produto", "es_centro", "tipo_material",
-            "origem", "lote", "dias_em_estoque", "produto", "grupo_mercadoria",
-            "es_totalestoque", "SKU"
-        ]
-        inserir_dados(df_tratado, "domrock.estoque", colunas)
-
-    else:
-        raise ValueError("Tipo inválido. Use 'vendas' ou 'estoque'.")
+        print(f"Erro ao importar {filepath} em domrock.{tipo}, nada foi gravado: {e}")
+        raise
+
+    total = _estatisticas_carga(stats["linhas"], inicio)
+    stats.update(segundos=total["segundos"], linhas_por_segundo=total["linhas_por_segundo"])
+    print(f"Importação de {filepath}: {stats['linhas']} linhas em {stats['blocos']} blocos, "
+          f"{stats['duplicadas']} duplicadas, {stats['ja_existentes']} já existentes e {stats['sem_data']} sem data ignoradas "
+          f"({stats['linhas_por_segundo']} linhas/s).")
+    return stats
@@ -1,28 +1,56 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, WebSocket, WebSocketDisconnect, status, Query, Depends
+from fastapi import FastAPI, Request, Response, UploadFile, File, HTTPException, WebSocket, WebSocketDisconnect, status, Query, Depends
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
+from datetime import date
+from contextlib import asynccontextmanager
 import os
+import uuid
+import hashlib
 import aiofiles
 from dotenv import load_dotenv
-from io import BytesIO
-import pandas as pd
-from importar import importar_csv
-from gerar_relatorios import gerar_relatorios
-from enviar_email import enviar_email
+import fila_importacao
+import fila_envios
+import relatorio_snapshot
 import crud_usuario
 import crud_dados
 import crud_dashboards
+import exportar
+from respostas import RespostaJSON
+import cache
+import analitico
+from db import get_pool_stats, get_async_pool_stats, fechar_pool, fechar_pool_async
 from auth.auth import verifciar_senha, criar_token
-from BaseModel.Email import Email
-from BaseModel.Upload import Upload
+from BaseModel.Email import Email, EmailsLote
+from BaseModel.Upload import Upload, ModoCarga, FormatoExportacao, FormatoRelatorio
 from BaseModel.Usuario import Usuario, UpdateUsuario, CreateUsuario
 from BaseModel.Dados import Venda, Estoque
-from Classes.Chatbot import chatbot_instance 
+import Classes.Chatbot as chatbot
+from Classes import processos_nlp
 import os
 import aiofiles
 
-app = FastAPI(title="Dom Rock Backend")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    fila_importacao.iniciar()
+    fila_envios.iniciar()
+    relatorio_snapshot.iniciar()
+    analitico.atualizar()
+    # O modelo do chatbot carrega em segundo plano; o resto da API já responde
+    chatbot.iniciar()
+    yield
+    fila_importacao.encerrar()
+    fila_envios.encerrar()
+    relatorio_snapshot.encerrar()
+    await chatbot.agendador.encerrar()
+    chatbot.encerrar()
+    # Fecha as conexões dos pools ao desligar o servidor
+    await fechar_pool_async()
+    fechar_pool()
+
+app = FastAPI(title="Dom Rock Backend", lifespan=lifespan)
 
 # ✅ Configuração do CORS
 app.add_middleware(
@@ -31,6 +59,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Proximo-Cursor"],
 )
 
 # Criar pasta uploads para salvar CSVs
@@ -42,139 +71,218 @@ load_dotenv(dotenv_path="src/.env")
 EMAIL_REMETENTE = os.getenv("EMAIL_REMETENTE")
 SENHA_APP = os.getenv("SENHA_APP")
 
-@app.post("/upload/{tipo}", status_code=status.HTTP_201_CREATED)
-async def upload_csv(tipo: Upload, file: UploadFile = File(...)):
+@app.post("/upload/{tipo}", status_code=status.HTTP_202_ACCEPTED)
+async def upload_csv(tipo: Upload, file: UploadFile = File(...), modo: ModoCarga = Query(ModoCarga.copy)):
     if tipo not in Upload:
         raise HTTPException(status_code=400, detail="Tipo inválido. Use 'vendas' ou 'estoque'")
 
-    filepath = os.path.join(UPLOAD_DIR, file.filename)
+    # Prefixo único: dois uploads com o mesmo nome não se sobrescrevem enquanto esperam na fila
+    filepath = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}_{file.filename}")
+    digest = hashlib.sha256()
 
     try:
         async with aiofiles.open(filepath, "wb") as out_file:
-            while content := await file.read(1024):
+            while content := await file.read(1024 * 1024):
+                digest.update(content)
                 await out_file.write(content)
     except Exception as e:
+        if os.path.exists(filepath):
+            os.remove(filepath)
         raise HTTPException(status_code=500, detail=f"Erro ao salvar arquivo: {str(e)}")
 
-    try:
-        importar_csv(filepath, tipo)
-        return {"status": "sucesso", "arquivo": file.filename, "tipo": tipo}
-    except Exception as e:
-        import traceback
-        print("ERRO AO IMPORTAR CSV")
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
+    # A importação roda num processo worker; o cliente acompanha pelo job_id
+    job_id = fila_importacao.enfileirar(
+        filepath, tipo.value, modo.value, sha256=digest.hexdigest(), nome_arquivo=file.filename
+    )
+    return {
+        "status": "na_fila",
+        "job_id": job_id,
+        "arquivo": file.filename,
+        "tipo": tipo,
+        "modo": modo,
+        "acompanhar": f"/importacoes/{job_id}",
+    }
+
+
+#status das importações em andamento/finalizadas
+@app.get("/importacoes")
+def listar_importacoes():
+    return fila_importacao.listar_jobs()
+
+
+@app.get("/importacoes/{job_id}")
+def status_importacao(job_id: str):
+    job = fila_importacao.status_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Importação não encontrada")
+    return job
 
 
-def metricas_para_bytes(metricas) -> bytes:
-    cleaned = {}
-    for chave, valor in metricas.items():
-        if isinstance(valor, dict):
-            cleaned[chave] = {
-                sub_k: (", ".join(sub_v) if isinstance(sub_v, list) else sub_v)
-                for sub_k, sub_v in valor.items()
-            }
-        else:
-            cleaned[chave] = valor
-
-    df = pd.DataFrame.from_dict(cleaned, orient="index")
-    buffer = BytesIO()
-    df.to_csv(buffer, index=True, encoding="utf-8")
-    buffer.seek(0)
-    return buffer.read()
-
-
-def metricas_para_texto(metricas: dict) -> str:
-    linhas = []
-    for chave, valor in metricas.items():
-        if isinstance(valor, dict) and 'descricao' in valor:
-            linhas.append(valor['descricao'])
-        else:
-            linhas.append(f"{chave}: {valor}")
-    return "\n".join(linhas)
-
-@app.post("/relatorios/enviar", status_code=status.HTTP_200_OK)
+@app.post("/relatorios/enviar", status_code=status.HTTP_202_ACCEPTED)
 def gerar_e_enviar(email: Email, assunto: str, corpo: str = ""):
-    try:
-        metricas = gerar_relatorios()
-        print("DEBUG - Métricas geradas com sucesso:", metricas)
+    # O relatório é gerado e enviado em segundo plano (fila_envios)
+    envio_id = fila_envios.enfileirar([email.email], assunto, corpo)
+    return {"status": "na_fila", "envio_id": envio_id, "acompanhar": f"/relatorios/envios/{envio_id}"}
+
+
+@app.post("/relatorios/enviar/lote", status_code=status.HTTP_202_ACCEPTED)
+def gerar_e_enviar_lote(emails: EmailsLote, assunto: str, corpo: str = ""):
+    envio_id = fila_envios.enfileirar([str(e) for e in emails.emails], assunto, corpo)
+    return {
+        "status": "na_fila",
+        "envio_id": envio_id,
+        "destinatarios": len(emails.emails),
+        "acompanhar": f"/relatorios/envios/{envio_id}",
+    }
+
 
-        relatorio_texto = metricas_para_texto(metricas)
-        mensagem_final = f"{corpo}\n\n{relatorio_texto}" if corpo else relatorio_texto
+@app.get("/relatorios/envios")
+def listar_envios():
+    return {"estatisticas": fila_envios.estatisticas(), "envios": fila_envios.listar_envios()}
 
-        relatorio_bytes = metricas_para_bytes(metricas)
 
-        enviar_email(
-            destinatario=email.email,
-            assunto=assunto,
-            corpo=mensagem_final,
-            arquivos={"relatorio_metricas.csv": relatorio_bytes}
-        )
+@app.get("/relatorios/envios/{envio_id}")
+def status_envio(envio_id: str):
+    envio = fila_envios.status_envio(envio_id)
+    if envio is None:
+        raise HTTPException(status_code=404, detail="Envio não encontrado")
+    return envio
 
-        print("DEBUG - E-mail enviado com sucesso!")
-        return {"status": "sucesso", "msg": f"Relatórios enviados para {email.email}"}
+
+#snapshot do relatório de métricas (o mesmo usado nos envios)
+@app.get("/relatorios/snapshot")
+def relatorio_atual():
+    try:
+        snapshot = relatorio_snapshot.obter_snapshot()
     except Exception as e:
-        import traceback
-        print("=== ERRO AO ENVIAR RELATÓRIO ===")
-        traceback.print_exc()
-        print("===============================")
         raise HTTPException(status_code=500, detail=str(e))
-    
+    resposta = {k: v for k, v in snapshot.items() if k != "csv"}
+    resposta["download"] = {f.value: f"/relatorios/snapshot/{f.value}" for f in FormatoRelatorio}
+    return resposta
+
+
+@app.get("/relatorios/snapshot/{formato}")
+def baixar_relatorio(request: Request, formato: FormatoRelatorio):
+    try:
+        snapshot = relatorio_snapshot.obter_snapshot()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    etag = f'"{snapshot["id"]}-{formato.value}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    if formato == FormatoRelatorio.csv:
+        conteudo = snapshot["csv"]
+    else:
+        try:
+            conteudo = exportar.metricas_para_colunar(snapshot["metricas"], formato.value)
+        except exportar.ExportacaoIndisponivel as e:
+            raise HTTPException(status_code=501, detail=str(e))
+    nome = f"relatorio_metricas_{snapshot['data_referencia']}.{formato.value}"
+    return Response(
+        content=conteudo,
+        media_type=exportar.TIPOS_CONTEUDO[formato.value],
+        headers={"Content-Disposition": f"attachment; filename={nome}", "ETag": etag},
+    )
 
 
 #-----------------CRUD Usuário-----------------#
 
 #criar usuario   
 @app.post("/usuario", response_model=Usuario, status_code=status.HTTP_201_CREATED)
-def create_usuario(usuario: CreateUsuario):
-    db_user = crud_usuario.read_usuario_byemail(email=usuario.email)
+async def create_usuario(usuario: CreateUsuario):
+    db_user = await crud_usuario.read_usuario_byemail_async(email=usuario.email)
     if db_user:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Email já registrado")
-    return crud_usuario.create_usuario(usuario)
+    return await crud_usuario.create_usuario_async(usuario)
 
 #pegar usuario
 @app.get("/usuario/{usuario_id}", response_model=Usuario, status_code=status.HTTP_200_OK)
-def read_usuario(usuario_id: int):
-    db_user = crud_usuario.read_usuario_byid(id=usuario_id)
+async def read_usuario(usuario_id: int):
+    db_user = await crud_usuario.read_usuario_byid_async(id=usuario_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
     return db_user
 
 #atualizar usuario
 @app.put("/usuario/{usuario_id}", response_model=Usuario, status_code=status.HTTP_200_OK)
-def update_usuario(usuario_id: int, usuario: UpdateUsuario):
-    updated_user = crud_usuario.update_usuario(id=usuario_id, usuario=usuario)
+async def update_usuario(usuario_id: int, usuario: UpdateUsuario):
+    updated_user = await crud_usuario.update_usuario_async(id=usuario_id, usuario=usuario)
     if updated_user is None:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
     return updated_user
 
 #deletar usuario
 @app.delete("/usuario/{usuario_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_usuario(usuario_id: int):
+async def delete_usuario(usuario_id: int):
     delete_user = usuario_id
     if delete_user is None:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
-    return crud_usuario.delete_usuario(id=usuario_id)
+    return await crud_usuario.delete_usuario_async(id=usuario_id)
 
 
 
 #-----------------Read dos Dados do Banco-----------------#
 
+# Paginação: passe o valor do header X-Proximo-Cursor em `cursor` para pegar a
+# próxima página (sem header = última página). `skip` continua aceito, mas fica
+# lento em páginas profundas.
+def _paginar(linhas: list, limit: int, coluna_id: str):
+    # As linhas saem direto pelo orjson; o response_model só documenta o formato
+    resposta = RespostaJSON(linhas)
+    cursor = crud_dados.proximo_cursor(linhas, limit, coluna_id)
+    if cursor:
+        resposta.headers["X-Proximo-Cursor"] = cursor
+    return resposta
+
+
+def _after_id(cursor: Optional[str], skip: int):
+    if cursor and skip:
+        raise HTTPException(status_code=400, detail="Use cursor ou skip, não os dois")
+    try:
+        return crud_dados.decodificar_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 #retornar os dados de vendas
 @app.get("/vendas", response_model=List[Venda])
-def listar_vendas(skip: int = Query(0, ge=0), limit: int = Query(10, ge=1, le=100)):
+async def listar_vendas(skip: int = Query(0, ge=0), limit: int = Query(10, ge=1, le=1000),
+                        cursor: Optional[str] = None):
+    after_id = _after_id(cursor, skip)
     try:
-        return crud_dados.get_vendas(skip=skip, limit=limit)
+        linhas = await crud_dados.get_vendas_linhas_async(skip=skip, limit=limit, after_id=after_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return _paginar(linhas, limit, "id_venda")
 
 #retornar os dados do estoque
 @app.get("/estoque", response_model=List[Estoque])
-def listar_estoque(skip: int = Query(0, ge=0), limit: int = Query(10, ge=1, le=100)):
+async def listar_estoque(skip: int = Query(0, ge=0), limit: int = Query(10, ge=1, le=1000),
+                         cursor: Optional[str] = None):
+    after_id = _after_id(cursor, skip)
     try:
-        return crud_dados.get_estoque(skip=skip, limit=limit)
+        linhas = await crud_dados.get_estoque_linhas_async(skip=skip, limit=limit, after_id=after_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return _paginar(linhas, limit, "id_estoque")
+
+#exportação completa em streaming (uma requisição, memória constante)
+@app.get("/exportar/{tipo}")
+def exportar_dados(tipo: Upload, formato: FormatoExportacao = Query(FormatoExportacao.ndjson),
+                   data_inicio: Optional[date] = None, data_fim: Optional[date] = None,
+                   sku: Optional[str] = None, cidade: Optional[str] = None, cliente: Optional[str] = None):
+    try:
+        pedacos = exportar.exportar(tipo.value, formato.value, data_inicio=data_inicio, data_fim=data_fim,
+                                    sku=sku, cidade=cidade, cliente=cliente)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except exportar.ExportacaoIndisponivel as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    return StreamingResponse(
+        pedacos,
+        media_type=exportar.TIPOS_CONTEUDO[formato.value],
+        headers={"Content-Disposition": f"attachment; filename={tipo.value}.{formato.value}"},
+    )
     
 
 
@@ -182,9 +290,10 @@ def listar_estoque(skip: int = Query(0, ge=0), limit: int = Query(10, ge=1, le=1
 
 #logar o usuário por email    
 @app.post("/login")
-def login(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = crud_usuario.read_usuario_byemail(form_data.username)
-    if not user or not verifciar_senha(form_data.password, user.senha):
+async def login(form_data: OAuth2PasswordRequestForm = Depends()):
+    user = await crud_usuario.read_usuario_byemail_async(form_data.username)
+    # argon2 é CPU-bound: verifica num thread para não travar o event loop
+    if not user or not await run_in_threadpool(verifciar_senha, form_data.password, user.senha):
         raise HTTPException(status_code=401, detail="Credenciais inválidas")
     token = criar_token({"sub": user.email})
     return {"access_token": token, "token_type": "bearer"}
@@ -192,13 +301,35 @@ def login(form_data: OAuth2PasswordRequestForm = Depends()):
 
 @app.get("/")
 def check():
-    return {"status": "ok", "msg": "API funcionando"}
+    return {"status": "ok", "msg": "API funcionando", "chatbot": chatbot.estado()}
+
+#estatísticas do pool de conexões com o banco
+@app.get("/db/pool")
+def pool_status():
+    return {"sync": get_pool_stats(), "async": get_async_pool_stats()}
+
+@app.get("/cache")
+def cache_status():
+    return cache.estatisticas()
 #-----------------Chatbot-----------------#
+@app.get("/chatbot/estatisticas")
+def chatbot_status():
+    # Quantas mensagens cada camada do classificador (léxico / embeddings) resolveu
+    motor = chatbot.nlp_engine_instance
+    return {
+        "estado": chatbot.estado(),
+        "classificador": motor.estatisticas() if motor is not None else None,
+        "lotes": chatbot.agendador.estatisticas(),
+        "cache": chatbot.estatisticas_cache(),
+        # Com CHATBOT_PROCESSOS: workers, lotes por camada e latência de cada lote nos processos
+        "processos": processos_nlp.estatisticas() if processos_nlp.ativo() else None,
+    }
+
 @app.websocket("/wb/chatbot")
 async def websocket_chatbot_endpoint(websocket: WebSocket):
     await websocket.accept()
 
-    if chatbot_instance is None:
+    if chatbot.estado()["status"] == "erro":
         await websocket.send_json({"erro": "O chatbot não está disponível no momento."})
         await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
         return
@@ -206,9 +337,36 @@ async def websocket_chatbot_endpoint(websocket: WebSocket):
     try:
         while True:
             user_question = await websocket.receive_text()
-            
-            # Toda a lógica está encapsulada nesta única chamada
-            response_data, matched_intent = chatbot_instance.get_response(user_question)
+
+            instancia = chatbot.chatbot_instance
+            if instancia is None:
+                # Ainda carregando os modelos: responde sem derrubar a conexão
+                estado = chatbot.estado()
+                erro = estado["status"] == "erro"
+                await websocket.send_json({
+                    "original_question": user_question,
+                    "matched_intent": None,
+                    "status": estado["status"],
+                    "answer": {"erro": "O chatbot não está disponível no momento."} if erro
+                              else {"resposta": ["O chatbot está aquecendo, tente novamente em alguns segundos."]},
+                })
+                continue
+
+            if not user_question:
+                response_data, matched_intent = {"erro": "A pergunta não pode ser vazia."}, "DESCONHECIDO"
+            else:
+                # Pergunta repetida sai do cache; as novas vão para o NLP em micro-lote com as
+                # das outras sessões. A consulta roda num thread, pois o banco é bloqueante
+                # e travaria os outros sockets
+                try:
+                    components = await chatbot.prever(user_question)
+                except Exception as e:
+                    print(f"Erro no NLP do chatbot: {e}")
+                    components = None
+                if components is None:
+                    response_data, matched_intent = {"erro": "Ocorreu um erro interno ao processar a pergunta."}, "DESCONHECIDO"
+                else:
+                    response_data, matched_intent = await run_in_threadpool(instancia.responder, components)
 
             await websocket.send_json({
                 "original_question": user_question,
@@ -226,25 +384,25 @@ async def websocket_chatbot_endpoint(websocket: WebSocket):
 #-----------------Dashboards-----------------#
 
 @app.get("/dash/top-produtos")
-def dash_top_produtos(limit: int = Query(5, ge=1, le=20)):
+async def dash_top_produtos(limit: int = Query(5, ge=1, le=20)):
     try:
-        return crud_dashboards.get_top_produtos(limit)
+        return RespostaJSON(await crud_dashboards.get_top_produtos_async(limit))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/dash/vendas-mensais")
-def dash_vendas_mensais():
+async def dash_vendas_mensais():
     try:
-        return crud_dashboards.get_vendas_mensais()
+        return RespostaJSON(await crud_dashboards.get_vendas_mensais_async())
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/dash/estoque-clientes")
-def dash_estoque_clientes():
+async def dash_estoque_clientes():
     try:
-        return crud_dashboards.get_estoque_por_cliente()
+        return RespostaJSON(await crud_dashboards.get_estoque_por_cliente_async())
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -0,0 +1,101 @@
+"""
+Migrações versionadas do schema domrock.
+
+Os arquivos de sql/migrations/NNN_nome.sql são aplicados em ordem, cada um na
+sua transação, e registrados em domrock.schema_migrations. Os de
+sql/migrations/opcionais/ só rodam quando pedidos pelo nome.
+
+Uso (dentro de src/, depois de rodar sql/domrock.sql):
+    python migrar.py                                 # aplica as pendentes
+    python migrar.py --listar                        # mostra o que já foi aplicado
+    python migrar.py --opcional particionar_vendas   # aplica também uma opcional
+"""
+import argparse
+import time
+from pathlib import Path
+from db import get_connection
+
+PASTA_MIGRACOES = Path(__file__).resolve().parent.parent / "sql" / "migrations"
+PASTA_OPCIONAIS = PASTA_MIGRACOES / "opcionais"
+
+# Chave do advisory lock: duas execuções ao mesmo tempo esperam uma pela outra
+LOCK_MIGRACOES = 7_246_001
+
+
+def _garantir_tabela(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS domrock.schema_migrations (
+            versao VARCHAR(100) PRIMARY KEY,
+            aplicada_em TIMESTAMP NOT NULL DEFAULT NOW(),
+            segundos NUMERIC(10,3)
+        )
+    """)
+
+
+def listar_migracoes(opcionais: list = None) -> list:
+    """(versao, caminho) das migrações numeradas e das opcionais pedidas, em ordem."""
+    migracoes = [(p.stem, p) for p in sorted(PASTA_MIGRACOES.glob("*.sql"))]
+    for nome in opcionais or []:
+        caminho = PASTA_OPCIONAIS / f"{nome}.sql"
+        if not caminho.exists():
+            raise ValueError(f"Migração opcional inexistente: {nome}")
+        migracoes.append((f"opcionais/{nome}", caminho))
+    return migracoes
+
+
+def migracoes_aplicadas() -> dict:
+    with get_connection() as connection, connection.cursor() as cursor:
+        _garantir_tabela(cursor)
+        cursor.execute("SELECT versao, aplicada_em, segundos FROM domrock.schema_migrations ORDER BY versao")
+        return {versao: {"aplicada_em": aplicada_em, "segundos": float(segundos or 0)}
+                for versao, aplicada_em, segundos in cursor.fetchall()}
+
+
+def aplicar_pendentes(opcionais: list = None) -> list:
+    """Aplica as migrações ainda não registradas e retorna as versões aplicadas."""
+    aplicadas = []
+    for versao, caminho in listar_migracoes(opcionais):
+        inicio = time.perf_counter()
+        with get_connection() as connection, connection.cursor() as cursor:
+            # Criação de índice em tabela grande passa fácil do statement_timeout do pool
+            cursor.execute("SET LOCAL statement_timeout = 0")
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", (LOCK_MIGRACOES,))
+            _garantir_tabela(cursor)
+            cursor.execute("SELECT 1 FROM domrock.schema_migrations WHERE versao = %s", (versao,))
+            if cursor.fetchone():
+                continue
+
+            print(f"Aplicando migração {versao}...")
+            cursor.execute(caminho.read_text(encoding="utf-8"))
+            segundos = time.perf_counter() - inicio
+            cursor.execute(
+                "INSERT INTO domrock.schema_migrations (versao, segundos) VALUES (%s, %s)",
+                (versao, round(segundos, 3))
+            )
+        print(f"Migração {versao} aplicada em {segundos:.2f}s")
+        aplicadas.append(versao)
+    return aplicadas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--listar", action="store_true", help="só mostra o estado das migrações")
+    parser.add_argument("--opcional", action="append", default=[], metavar="NOME",
+                        help="migração de sql/migrations/opcionais/ para aplicar junto")
+    args = parser.parse_args()
+
+    if args.listar:
+        aplicadas = migracoes_aplicadas()
+        opcionais = [p.stem for p in sorted(PASTA_OPCIONAIS.glob("*.sql"))]
+        for versao, _ in listar_migracoes(opcionais):
+            estado = f"aplicada em {aplicadas[versao]['aplicada_em']:%Y-%m-%d %H:%M}" if versao in aplicadas else "pendente"
+            print(f"{versao:<40} {estado}")
+        return
+
+    aplicadas = aplicar_pendentes(args.opcional)
+    if not aplicadas:
+        print("Nenhuma migração pendente.")
+
+
+if __name__ == "__main__":
+    main()
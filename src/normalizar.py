@@ -1,63 +1,111 @@
+import numpy as np
 import pandas as pd
 from pathlib import Path
+from functools import lru_cache
 import unicodedata
 
+# Strings em Arrow quando o pyarrow está instalado (menos memória que object)
+try:
+    import pyarrow  # noqa: F401
+    TIPO_TEXTO = pd.StringDtype("pyarrow")
+except ImportError:
+    TIPO_TEXTO = object
+
+# Colunas com poucos valores distintos viram category: cada valor é guardado uma vez
+COLUNAS_CATEGORICAS = {
+    "zs_uf", "zs_centro", "es_centro", "origem", "produto", "SKU",
+    "zs_gr_mercad", "tipo_material", "grupo_mercadoria",
+}
+
+# Normalização de cada coluna de texto
+TITULO = lambda s: s.str.strip().str.title()
+MAIUSCULO = lambda s: s.str.strip().str.upper()
+NORMALIZACOES = {
+    "produto": TITULO,
+    "origem": TITULO,
+    "zs_gr_mercad": TITULO,
+    "zs_cidade": TITULO,
+    "zs_uf": TITULO,
+    "SKU": TITULO,
+    "tipo_material": TITULO,
+    "grupo_mercadoria": TITULO,
+    "cod_cliente": lambda s: s.str.zfill(5),  # 5 dígitos
+    "cod_produto": MAIUSCULO,  # maiúsculo sem espaços
+    "zs_centro": MAIUSCULO,  # centros logísticos
+    "es_centro": MAIUSCULO,
+}
+
+
+def _normalizar_coluna(serie: pd.Series, normalizacao) -> pd.Series:
+    """
+    Normaliza só os valores distintos da coluna e espalha o resultado de volta
+    pelos códigos, em vez de rodar as operações de string linha a linha.
+    """
+    codigos, unicos = pd.factorize(serie)
+    normalizados = normalizacao(pd.Series(unicos.astype(str), dtype=object))
+
+    # Valores diferentes podem virar o mesmo ("curitiba " e "CURITIBA")
+    codigos_finais, categorias = pd.factorize(normalizados)
+    # factorize marca nulos com -1, que indexado viraria o último valor
+    presentes = codigos != -1
+    codigos[presentes] = codigos_finais[codigos[presentes]]
+
+    if serie.name in COLUNAS_CATEGORICAS:
+        valores = pd.Categorical.from_codes(codigos, categories=categorias)
+    else:
+        texto = np.full(len(codigos), None, dtype=object)
+        texto[presentes] = np.asarray(categorias, dtype=object)[codigos[presentes]]
+        valores = pd.array(texto, dtype=TIPO_TEXTO)
+    return pd.Series(valores, index=serie.index, name=serie.name)
+
+
 def tratar_dados(df, tipo:str):
-    # Remover duplicados e cópia independente
-    df = df.drop_duplicates().copy()
-
-    # Garantir datas no formato YYYY-MM-DD
-    if "data" in df.columns:
-        df["data"] = pd.to_datetime(df["data"], errors='coerce')
-
-    # Corrigir valores nulos
-    for col in df.columns:
-        if df[col].dtype == "object":
-            df[col] = df[col].fillna("NA") #string fica "NA"
-        else:
-            df[col] = df[col].fillna(0) #numérico fica 0
-
-    # Normalizar colunas de texto
-    text_cols = [
-        "produto", "origem", "zs_gr_mercad", "zs_cidade", "zs_uf", "SKU",
-        "tipo_material", "grupo_mercadoria"
-    ]
-    for col in text_cols:
-        if col in df.columns:
-            df[col] = df[col].astype(str).str.strip().str.title()
-
-    # Padronizar cod_cliente para 5 dígitos
-    if "cod_cliente" in df.columns:
-        df["cod_cliente"] = df["cod_cliente"].astype(str).str.zfill(5)
-
-    # Padronizar cod_produto para string maiúscula sem espaços
-    if "cod_produto" in df.columns:
-        df["cod_produto"] = df["cod_produto"].astype(str).str.strip().str.upper()
-
-    # Padronizar centros logísticos
-    if "zs_centro" in df.columns:
-        df["zs_centro"] = df["zs_centro"].astype(str).str.strip().str.upper()
-    if "es_centro" in df.columns:
-        df["es_centro"] = df["es_centro"].astype(str).str.strip().str.upper()
-
-    # Tipos numéricos
-    if tipo == "estoque":
-        if "es_totalestoque" in df.columns:
-            df["es_totalestoque"] = pd.to_numeric(df["es_totalestoque"], errors="coerce").fillna(0)
-        if "dias_em_estoque" in df.columns:
-            df["dias_em_estoque"] = pd.to_numeric(df["dias_em_estoque"], errors="coerce").fillna(0).astype(int)
-    elif tipo == "vendas":
-        if "giro_sku_cliente" in df.columns:
-            df["giro_sku_cliente"] = pd.to_numeric(df["giro_sku_cliente"], errors="coerce").fillna(0)
-        if "zs_peso_liquido" in df.columns:
-            df["zs_peso_liquido"] = pd.to_numeric(df["zs_peso_liquido"], errors="coerce").fillna(0)
+    # Remover duplicados (drop_duplicates já devolve um DataFrame novo, não precisa de .copy())
+    df = df.drop_duplicates()
+
+    # O DataFrame é nosso: as atribuições abaixo não afetam o original
+    with pd.option_context("mode.chained_assignment", None):
+        # Garantir datas no formato YYYY-MM-DD
+        if "data" in df.columns:
+            df["data"] = pd.to_datetime(df["data"], errors='coerce')
+
+        # Corrigir valores nulos numa única passada: texto fica "NA", o resto fica 0
+        # (data inválida continua nula e a importação descarta a linha)
+        preenchimento = {
+            col: "NA" if df[col].dtype == "object" else 0
+            for col in df.columns
+            if col != "data" and df[col].hasnans
+        }
+        if preenchimento:
+            df = df.fillna(preenchimento)
+
+        # Normalizar colunas de texto (uma vez por valor distinto)
+        for col, normalizacao in NORMALIZACOES.items():
+            if col in df.columns:
+                df[col] = _normalizar_coluna(df[col], normalizacao)
+
+        # Tipos numéricos
+        if tipo == "estoque":
+            if "es_totalestoque" in df.columns:
+                df["es_totalestoque"] = pd.to_numeric(df["es_totalestoque"], errors="coerce").fillna(0)
+            if "dias_em_estoque" in df.columns:
+                df["dias_em_estoque"] = pd.to_numeric(df["dias_em_estoque"], errors="coerce").fillna(0).astype(int)
+        elif tipo == "vendas":
+            if "giro_sku_cliente" in df.columns:
+                df["giro_sku_cliente"] = pd.to_numeric(df["giro_sku_cliente"], errors="coerce").fillna(0)
+            if "zs_peso_liquido" in df.columns:
+                df["zs_peso_liquido"] = pd.to_numeric(df["zs_peso_liquido"], errors="coerce").fillna(0)
 
     return df
 
+
+@lru_cache(maxsize=4096)
 def normalizar_texto(texto):
     texto = texto.lower().strip()
-    texto = ''.join(
+    if texto.isascii():
+        return texto  # sem acentos: a decomposição NFD não mudaria nada
+    # Remove as marcas combinantes (acentos) que sobram da decomposição NFD
+    return ''.join(
         c for c in unicodedata.normalize('NFD', texto)
         if unicodedata.category(c) != 'Mn'
     )
-    return texto
\ No newline at end of file
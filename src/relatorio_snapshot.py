@@ -0,0 +1,131 @@
+"""
+Snapshots do relatório de métricas.
+
+O relatório é calculado uma vez por versão dos dados (domrock.versao_dados) e
+data de referência (as métricas olham as últimas 52 semanas a partir de hoje)
+e guardado em domrock.relatorio_snapshots junto com o texto e o CSV já
+montados. Envios de e-mail e o download reaproveitam o snapshot em vez de
+refazer as consultas e o DataFrame a cada pedido.
+
+Com RELATORIO_SNAPSHOT_MINUTOS > 0, um thread confere periodicamente se os
+dados mudaram e já deixa o próximo snapshot pronto.
+"""
+import os
+import threading
+from datetime import date
+from psycopg2 import Binary
+from psycopg2.extras import Json
+import cache
+from db import get_connection
+from gerar_relatorios import gerar_relatorios, metricas_para_texto, metricas_para_bytes, DESCRICOES
+
+SNAPSHOT_CONFIG = {
+    "intervalo_minutos": float(os.getenv("RELATORIO_SNAPSHOT_MINUTOS", "0")),  # 0 = só sob demanda
+    "guardados": int(os.getenv("RELATORIO_SNAPSHOTS_GUARDADOS", "30")),
+}
+
+_atual = None  # último snapshot usado por este processo
+_lock = threading.Lock()  # um cálculo por vez: quem chega junto espera e reaproveita
+_parar = threading.Event()
+_thread = None
+
+COLUNAS = "id, versao_dados, data_referencia, gerado_em, metricas, texto, csv, tempos_ms"
+
+
+def _linha_para_snapshot(linha) -> dict:
+    snapshot = dict(zip(COLUNAS.split(", "), linha))
+    snapshot["csv"] = bytes(snapshot["csv"])
+    # JSONB não guarda a ordem das chaves: volta para a ordem do relatório
+    ordem = {nome: i for i, nome in enumerate(DESCRICOES)}
+    snapshot["metricas"] = dict(sorted(snapshot["metricas"].items(), key=lambda item: ordem.get(item[0], len(ordem))))
+    return snapshot
+
+
+def _buscar_salvo(versao: int, referencia: date):
+    """Snapshot já gerado (por este ou outro processo) para a versão e o dia."""
+    with get_connection() as connection, connection.cursor() as cursor:
+        cursor.execute(
+            f"""SELECT {COLUNAS} FROM domrock.relatorio_snapshots
+                WHERE versao_dados = %s AND data_referencia = %s
+                ORDER BY id DESC LIMIT 1""",
+            (versao, referencia),
+        )
+        linha = cursor.fetchone()
+    return _linha_para_snapshot(linha) if linha else None
+
+
+def _gerar_e_salvar(versao: int, referencia: date) -> dict:
+    metricas, tempos = gerar_relatorios(com_tempos=True)
+    if "erro" in metricas:
+        # Relatório incompleto não vira snapshot: quem pediu trata o erro (a fila de envios tenta de novo)
+        raise RuntimeError(f"Relatório incompleto: {metricas['erro']}")
+
+    texto, csv = metricas_para_texto(metricas), metricas_para_bytes(metricas)
+    with get_connection() as connection, connection.cursor() as cursor:
+        cursor.execute(
+            f"""INSERT INTO domrock.relatorio_snapshots
+                    (versao_dados, data_referencia, metricas, texto, csv, tempos_ms)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                RETURNING {COLUNAS}""",
+            (versao, referencia, Json(metricas), texto, Binary(csv), Json(tempos)),
+        )
+        snapshot = _linha_para_snapshot(cursor.fetchone())
+        cursor.execute(
+            """DELETE FROM domrock.relatorio_snapshots
+               WHERE id NOT IN (SELECT id FROM domrock.relatorio_snapshots ORDER BY id DESC LIMIT %s)""",
+            (SNAPSHOT_CONFIG["guardados"],),
+        )
+    print(f"Snapshot {snapshot['id']} do relatório gerado (versão dos dados {versao}, {referencia})")
+    return snapshot
+
+
+def _vale(snapshot, versao: int, referencia: date) -> bool:
+    return snapshot is not None and snapshot["versao_dados"] == versao and snapshot["data_referencia"] == referencia
+
+
+def obter_snapshot() -> dict:
+    """
+    Snapshot da versão atual dos dados para hoje, gerando se ainda não existir.
+    Retorna um dict com id, versao_dados, data_referencia, gerado_em, metricas,
+    texto, csv (bytes) e tempos_ms.
+    """
+    global _atual
+    versao, referencia = cache.versao_dados(), date.today()
+    snapshot = _atual
+    if _vale(snapshot, versao, referencia):
+        return snapshot
+
+    with _lock:
+        if _vale(_atual, versao, referencia):
+            return _atual
+        snapshot = _buscar_salvo(versao, referencia) or _gerar_e_salvar(versao, referencia)
+        _atual = snapshot
+        return snapshot
+
+
+def _agendador():
+    intervalo = SNAPSHOT_CONFIG["intervalo_minutos"] * 60
+    while not _parar.wait(intervalo):
+        try:
+            obter_snapshot()
+        except Exception as e:
+            print(f"Erro ao atualizar o snapshot do relatório: {e}")
+
+
+def iniciar():
+    global _thread
+    if _thread is not None or SNAPSHOT_CONFIG["intervalo_minutos"] <= 0:
+        return
+    _parar.clear()
+    _thread = threading.Thread(target=_agendador, name="snapshot-relatorio", daemon=True)
+    _thread.start()
+    print(f"Snapshot do relatório conferido a cada {SNAPSHOT_CONFIG['intervalo_minutos']:g} min")
+
+
+def encerrar(timeout: float = 10):
+    global _thread
+    if _thread is None:
+        return
+    _parar.set()
+    _thread.join(timeout)
+    _thread = None
@@ -0,0 +1,29 @@
+"""
+Serialização rápida das respostas de leitura.
+
+Os endpoints de listagem e dashboards devolvem dicts/tuplas do banco direto
+para o orjson, sem montar um modelo pydantic por linha e sem a segunda
+validação do response_model do FastAPI (que fica só para a documentação).
+"""
+from decimal import Decimal
+import orjson
+from fastapi.responses import Response
+
+
+def _padrao(valor):
+    # NUMERIC do Postgres chega como Decimal; os modelos expõem esses campos como float
+    if isinstance(valor, Decimal):
+        return float(valor)
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+
+def para_json(conteudo) -> bytes:
+    """date/datetime/UUID saem em ISO pelo próprio orjson; Decimal vira float."""
+    return orjson.dumps(conteudo, default=_padrao)
+
+
+class RespostaJSON(Response):
+    media_type = "application/json"
+
+    def render(self, conteudo) -> bytes:
+        return para_json(conteudo)
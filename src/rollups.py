@@ -0,0 +1,34 @@
+"""
+Agregados diários/mensais de vendas e estoque (sql/migrations/002_rollups.sql).
+
+A importação recalcula só os dias presentes no arquivo, dentro da mesma
+transação da carga; os dashboards leem daqui em vez das tabelas de fatos.
+
+Para reconstruir tudo (por exemplo, depois de apagar linhas na mão):
+    python rollups.py [vendas|estoque]
+"""
+import sys
+from db import get_connection
+
+TIPOS = ("vendas", "estoque")
+
+
+def atualizar_rollups(cursor, tipo: str, staging: str):
+    """Recalcula os agregados dos dias que aparecem na tabela de staging."""
+    cursor.execute(
+        f"SELECT domrock.atualizar_rollup_{tipo}(ARRAY(SELECT DISTINCT data FROM {staging}))"
+    )
+
+
+def reconstruir_rollups(tipo: str):
+    if tipo not in TIPOS:
+        raise ValueError("Tipo inválido. Use 'vendas' ou 'estoque'.")
+    with get_connection() as connection, connection.cursor() as cursor:
+        cursor.execute("SET LOCAL statement_timeout = 0")
+        cursor.execute(f"SELECT domrock.atualizar_rollup_{tipo}(ARRAY(SELECT DISTINCT data FROM domrock.{tipo}))")
+    print(f"Agregados de {tipo} reconstruídos.")
+
+
+if __name__ == "__main__":
+    for tipo in sys.argv[1:] or TIPOS:
+        reconstruir_rollups(tipo)
@@ -0,0 +1,33 @@
+"""
+Os testes rodam contra um Postgres de verdade, num banco só para eles
+(TEST_DB_NAME, criado vazio antes; as demais variáveis DB_* vêm do .env).
+Sem TEST_DB_NAME os testes que usam o banco são pulados.
+
+Uso (dentro de src/):
+    TEST_DB_NAME=domrock_testes python -m pytest tests
+"""
+import os
+import sys
+from pathlib import Path
+import pytest
+
+PASTA_SRC = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PASTA_SRC))
+
+# db.py lê o nome do banco na importação: troca antes de qualquer import do projeto
+if os.getenv("TEST_DB_NAME"):
+    os.environ["DB_NAME"] = os.environ["TEST_DB_NAME"]
+
+
+@pytest.fixture(scope="session")
+def banco():
+    """Schema domrock e migrações aplicados no banco de testes."""
+    if not os.getenv("TEST_DB_NAME"):
+        pytest.skip("TEST_DB_NAME não definido")
+    from db import get_connection
+    import migrar
+
+    with get_connection() as connection, connection.cursor() as cursor:
+        cursor.execute((PASTA_SRC.parent / "sql" / "domrock.sql").read_text(encoding="utf-8"))
+    migrar.aplicar_pendentes()
+    return get_connection
@@ -0,0 +1,71 @@
+import uuid
+import pytest
+import importar
+
+CABECALHO = "data|cod_cliente|lote|origem|zs_gr_mercad|produto|cod_produto|zs_centro|zs_cidade|zs_uf|zs_peso_liquido|giro_sku_cliente|SKU"
+
+
+def _linha(lote: str, data: str = "2024-01-10") -> str:
+    return f"{data}|366|{lote}|PRG|ZINCADO|Chapa|CZN|22D1|CURITIBA|PR|1.356|17.98|SKU1"
+
+
+def _csv(tmp_path, linhas: list, nome: str = "vendas.csv") -> str:
+    caminho = tmp_path / nome
+    caminho.write_text("\n".join([CABECALHO] + linhas) + "\n", encoding="utf-8")
+    return str(caminho)
+
+
+def _lote() -> str:
+    # Lote único por teste: os testes dividem o mesmo banco
+    return f"T{uuid.uuid4().hex[:12]}"
+
+
+def _contar(banco, prefixo: str) -> int:
+    with banco() as connection, connection.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM domrock.vendas WHERE lote LIKE %s", (prefixo + "%",))
+        return cursor.fetchone()[0]
+
+
+def test_duplicada_entre_blocos(banco, tmp_path):
+    lote = _lote()
+    # Blocos de 2 linhas: a repetição da 1ª linha só aparece no 2º bloco
+    caminho = _csv(tmp_path, [_linha(f"{lote}/1"), _linha(f"{lote}/2"), _linha(f"{lote}/1")])
+
+    stats = importar.importar_csv(caminho, "vendas", linhas_por_bloco=2)
+
+    assert stats["blocos"] == 2
+    assert stats["linhas"] == 2
+    assert stats["duplicadas"] == 1
+    assert _contar(banco, lote) == 2
+
+
+def test_reenvio_nao_insere_nada(banco, tmp_path):
+    lote = _lote()
+    linhas = [_linha(f"{lote}/{i}") for i in range(5)]
+    caminho = _csv(tmp_path, linhas)
+    assert importar.importar_csv(caminho, "vendas")["linhas"] == 5
+
+    # Mesmo arquivo: barrado pelo sha256 em domrock.importacoes
+    repetido = importar.importar_csv(caminho, "vendas")
+    assert repetido["arquivo_repetido"]
+    assert repetido["linhas"] == 0
+
+    # Mesmas linhas em outro arquivo (sha256 diferente): barradas pelo hash_linha
+    sobreposto = _csv(tmp_path, linhas[::-1], "vendas_reordenado.csv")
+    stats = importar.importar_csv(sobreposto, "vendas")
+    assert not stats["arquivo_repetido"]
+    assert stats["linhas"] == 0
+    assert stats["ja_existentes"] == 5
+    assert _contar(banco, lote) == 5
+
+
+@pytest.mark.parametrize("modo", sorted(importar.MODOS_CARGA))
+def test_data_invalida_igual_nos_dois_modos(banco, tmp_path, modo):
+    lote = _lote()
+    caminho = _csv(tmp_path, [_linha(f"{lote}/1"), _linha(f"{lote}/2", data="lixo"), _linha(f"{lote}/3")])
+
+    stats = importar.importar_csv(caminho, "vendas", modo=modo)
+
+    assert stats["linhas"] == 2
+    assert stats["sem_data"] == 1
+    assert _contar(banco, lote) == 2